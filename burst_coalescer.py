@@ -0,0 +1,71 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+
+class Burst:
+    __slots__ = ("channel_id", "items", "opened_at", "full")
+
+    def __init__(self, channel_id: str):
+        self.channel_id = channel_id
+        self.items: List[Any] = []
+        self.opened_at = time.time()
+        self.full = asyncio.Event()
+
+
+class BurstCoalescer:
+
+    def __init__(self, max_window: float = 12.0, max_size: int = 5):
+        self.max_window = max_window
+        self.max_size = max_size
+        self._open: Dict[str, Burst] = {}
+        self.bursts = 0
+        self.merged = 0
+        self.largest_burst = 0
+
+    async def collect(self, channel_id: str, item: Any, window: float) -> Optional[List[Any]]:
+        burst = self._open.get(channel_id)
+        if burst is not None:
+            burst.items.append(item)
+            self.merged += 1
+            if len(burst.items) >= self.max_size:
+                burst.full.set()
+                del self._open[channel_id]
+            return None
+
+        burst = Burst(channel_id)
+        burst.items.append(item)
+        if self.max_size > 1:
+            self._open[channel_id] = burst
+        else:
+            burst.full.set()
+        self.bursts += 1
+
+        try:
+            window = min(window, self.max_window)
+            if burst.full.is_set():
+                await asyncio.sleep(window)
+            else:
+                await asyncio.wait_for(burst.full.wait(), timeout=window)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if self._open.get(channel_id) is burst:
+                del self._open[channel_id]
+
+        self.largest_burst = max(self.largest_burst, len(burst.items))
+        if len(burst.items) > 1:
+            print(f"Coalesced {len(burst.items)} messages in channel {channel_id} into one response "
+                  f"after {time.time() - burst.opened_at:.1f}s")
+        return burst.items
+
+    def stats(self) -> Dict:
+        total = self.bursts + self.merged
+        return {
+            "open_bursts": len(self._open),
+            "bursts": self.bursts,
+            "merged_messages": self.merged,
+            "llm_calls_saved": self.merged,
+            "largest_burst": self.largest_burst,
+            "messages_per_call": total / self.bursts if self.bursts else 0.0
+        }
@@ -1,11 +1,18 @@
 import sys
 import os
 from message_memory import MessageMemory
+from sqlite_memory import SQLiteMessageMemory
 
-def clear_memory():
+def open_memory(use_sqlite=False):
+    if use_sqlite:
+        return SQLiteMessageMemory(import_file=None)
+    return MessageMemory()
+
+def clear_memory(use_sqlite=False):
     try:
-        memory = MessageMemory()
+        memory = open_memory(use_sqlite)
         memory.clear_memory()
+        memory.close()
         
         print("Message memory cleared successfully!")
         return True
@@ -14,10 +21,14 @@ def clear_memory():
         print(f"Error clearing memory: {e}")
         return False
 
-def show_memory_stats():
+def show_memory_stats(use_sqlite=False):
     try:
-        memory = MessageMemory()
+        memory = open_memory(use_sqlite)
         size = memory.get_memory_size()
+        if use_sqlite:
+            memory.close()
+        else:
+            memory.close(compact=False)
         
         print(f"Current memory size: {size} messages")
         
@@ -30,14 +41,20 @@ def show_memory_stats():
         print(f"Error checking memory stats: {e}")
 
 def main():
-    if len(sys.argv) > 1:
-        if sys.argv[1] in ['--stats', '-s']:
-            show_memory_stats()
+    args = sys.argv[1:]
+    use_sqlite = '--sqlite' in args
+    if use_sqlite:
+        args.remove('--sqlite')
+
+    if len(args) > 0:
+        if args[0] in ['--stats', '-s']:
+            show_memory_stats(use_sqlite)
             return
-        elif sys.argv[1] in ['--help', '-h']:
+        elif args[0] in ['--help', '-h']:
             print("Usage: python clear_memory.py [options]")
             print("Options:")
             print("  --stats, -s     Show current memory statistics")
+            print("  --sqlite        Use the SQLite memory database (message_memory.db)")
             print("  --help, -h      Show this help message")
             print("  (no args)       Clear memory (default action)")
             return
@@ -47,7 +64,7 @@ def main():
     print("=" * 50)
     print("")
     
-    success = clear_memory()
+    success = clear_memory(use_sqlite)
     
     if success:
         pass
@@ -0,0 +1,104 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+CommandHandler = Callable[[Any, str], Awaitable[bool]]
+
+
+class Command:
+    __slots__ = ("name", "handler", "permission", "scope", "stage", "invocations",
+                 "handled", "total_time", "max_time")
+
+    def __init__(self, name: str, handler: CommandHandler, permission: str, scope: str, stage: str):
+        self.name = name
+        self.handler = handler
+        self.permission = permission
+        self.scope = scope
+        self.stage = stage
+        self.invocations = 0
+        self.handled = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+
+class CommandRouter:
+
+    def __init__(self, permissions: Dict[str, Callable[[Any], bool]],
+                 scopes: Dict[str, Callable[[Any], bool]], prefix: str = "!"):
+        self.permissions = permissions
+        self.scopes = scopes
+        self.prefix = prefix
+        self._table: Dict[str, Dict[Optional[str], Command]] = {}
+        self.commands: List[Command] = []
+
+    def register(self, name: str, handler: CommandHandler, permission: str = "everyone",
+                 scope: str = "any", stage: str = "post_memory"):
+        if permission not in self.permissions:
+            raise ValueError(f"Unknown permission level: {permission}")
+        if scope not in self.scopes:
+            raise ValueError(f"Unknown command scope: {scope}")
+
+        tokens = name.lower().split()
+        if not tokens or not tokens[0].startswith(self.prefix) or len(tokens) > 2:
+            raise ValueError(f"Invalid command name: {name}")
+
+        command = Command(name, handler, permission, scope, stage)
+        subcommands = self._table.setdefault(tokens[0], {})
+        subcommands[tokens[1] if len(tokens) > 1 else None] = command
+        self.commands.append(command)
+
+    def match(self, content: str) -> Optional[Command]:
+        if not content.startswith(self.prefix):
+            return None
+
+        tokens = content.split(None, 2)
+        subcommands = self._table.get(tokens[0].lower())
+        if subcommands is None:
+            return None
+
+        if len(tokens) > 1:
+            command = subcommands.get(tokens[1].lower())
+            if command is not None:
+                return command
+        return subcommands.get(None)
+
+    async def dispatch(self, message: Any, stage: str) -> bool:
+        content = message.content.strip()
+        command = self.match(content)
+        if command is None or command.stage != stage:
+            return False
+
+        if not self.permissions[command.permission](message):
+            return False
+        if not self.scopes[command.scope](message):
+            return False
+
+        parts = content.split(None, len(command.name.split()))
+        args = parts[-1] if len(parts) > len(command.name.split()) else ""
+
+        started = time.monotonic()
+        command.invocations += 1
+        try:
+            handled = await command.handler(message, args)
+        finally:
+            elapsed = time.monotonic() - started
+            command.total_time += elapsed
+            command.max_time = max(command.max_time, elapsed)
+
+        if handled:
+            command.handled += 1
+        return bool(handled)
+
+    def stats(self) -> List[Dict]:
+        return [
+            {
+                "command": command.name,
+                "permission": command.permission,
+                "scope": command.scope,
+                "stage": command.stage,
+                "invocations": command.invocations,
+                "handled": command.handled,
+                "avg_latency": command.total_time / command.invocations if command.invocations else 0.0,
+                "max_latency": command.max_time
+            }
+            for command in self.commands
+        ]
@@ -0,0 +1,112 @@
+import sys
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Dict, List, Optional
+
+
+class HistoryEntry:
+    __slots__ = ("role", "content", "user_name", "timestamp")
+
+    def __init__(self, role: str, content: str, user_name: Optional[str], timestamp: float):
+        self.role = role
+        self.content = content
+        self.user_name = user_name
+        self.timestamp = timestamp
+
+
+class ChannelHistory:
+    __slots__ = ("entries", "last_active")
+
+    def __init__(self, max_entries: int):
+        self.entries: deque = deque(maxlen=max_entries)
+        self.last_active = time.time()
+
+
+class ConversationHistory:
+
+    def __init__(self, max_per_channel: int = 25, max_channels: int = 500, max_entries: int = 5000,
+                 idle_timeout: float = 86400):
+        self.max_per_channel = max_per_channel
+        self.max_channels = max_channels
+        self.max_entries = max(max_entries, max_per_channel)
+        self.idle_timeout = idle_timeout
+        self._channels: "OrderedDict[str, ChannelHistory]" = OrderedDict()
+        self.total_entries = 0
+        self.evicted_channels = 0
+        self.evicted_entries = 0
+
+    def __contains__(self, channel_id: str) -> bool:
+        return channel_id in self._channels
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def _evict_channel(self, channel_id: str):
+        history = self._channels.pop(channel_id)
+        self.total_entries -= len(history.entries)
+        self.evicted_channels += 1
+        self.evicted_entries += len(history.entries)
+
+    def evict_idle(self, now: Optional[float] = None):
+        cutoff = (now or time.time()) - self.idle_timeout
+        while self._channels:
+            channel_id, history = next(iter(self._channels.items()))
+            if history.last_active >= cutoff:
+                break
+            self._evict_channel(channel_id)
+
+    def append(self, channel_id: str, role: str, content: str, user_name: Optional[str] = None):
+        now = time.time()
+        history = self._channels.get(channel_id)
+        if history is None:
+            history = self._channels[channel_id] = ChannelHistory(self.max_per_channel)
+        else:
+            self._channels.move_to_end(channel_id)
+
+        if len(history.entries) == history.entries.maxlen:
+            self.total_entries -= 1
+        history.entries.append(HistoryEntry(role, content, user_name, now))
+        history.last_active = now
+        self.total_entries += 1
+
+        self.evict_idle(now)
+        while len(self._channels) > self.max_channels or self.total_entries > self.max_entries:
+            oldest = next(iter(self._channels))
+            if oldest == channel_id:
+                break
+            self._evict_channel(oldest)
+
+    def get(self, channel_id: str, limit: Optional[int] = None) -> List[HistoryEntry]:
+        history = self._channels.get(channel_id)
+        if history is None:
+            return []
+
+        entries = history.entries
+        if limit is None or limit >= len(entries):
+            return list(entries)
+        return list(islice(entries, len(entries) - limit, None))
+
+    def clear(self, channel_id: Optional[str] = None):
+        if channel_id is None:
+            self._channels.clear()
+            self.total_entries = 0
+        elif channel_id in self._channels:
+            self.total_entries -= len(self._channels.pop(channel_id).entries)
+
+    def stats(self) -> Dict:
+        content_bytes = 0
+        for history in self._channels.values():
+            for entry in history.entries:
+                content_bytes += sys.getsizeof(entry.content)
+
+        entry_bytes = sys.getsizeof(HistoryEntry("", "", None, 0.0))
+        return {
+            "channels": len(self._channels),
+            "entries": self.total_entries,
+            "max_channels": self.max_channels,
+            "max_entries": self.max_entries,
+            "evicted_channels": self.evicted_channels,
+            "evicted_entries": self.evicted_entries,
+            "approx_bytes": content_bytes + self.total_entries * entry_bytes
+        }
@@ -0,0 +1,128 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+
+class Job:
+    __slots__ = ("name", "func", "interval", "jitter", "timeout", "overlap", "initial_delay",
+                 "loop_task", "running", "runs", "failures", "timeouts", "skipped",
+                 "last_started", "last_duration", "last_lag", "max_lag")
+
+    def __init__(self, name: str, func: Callable[[], Awaitable], interval: float, jitter: float,
+                 timeout: Optional[float], overlap: str, initial_delay: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.timeout = timeout
+        self.overlap = overlap
+        self.initial_delay = initial_delay
+        self.loop_task: Optional[asyncio.Task] = None
+        self.running: Set[asyncio.Task] = set()
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.last_started: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_lag: Optional[float] = None
+        self.max_lag = 0.0
+
+
+class JobScheduler:
+
+    OVERLAP_POLICIES = ("skip", "cancel", "allow")
+
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+
+    def add_job(self, name: str, func: Callable[[], Awaitable], interval: float, jitter: float = 0,
+                timeout: Optional[float] = None, overlap: str = "skip", initial_delay: float = 0):
+        if overlap not in self.OVERLAP_POLICIES:
+            raise ValueError(f"overlap must be one of {self.OVERLAP_POLICIES}")
+        if name in self.jobs:
+            raise ValueError(f"Job {name} is already registered")
+
+        self.jobs[name] = Job(name, func, interval, jitter, timeout, overlap, initial_delay)
+
+    def start(self):
+        for job in self.jobs.values():
+            if job.loop_task is None or job.loop_task.done():
+                job.loop_task = asyncio.create_task(self._job_loop(job))
+
+    def _next_delay(self, job: Job) -> float:
+        return job.interval + (random.uniform(0, job.jitter) if job.jitter else 0)
+
+    async def _job_loop(self, job: Job):
+        next_run = time.monotonic() + job.initial_delay
+        while True:
+            await asyncio.sleep(max(0.0, next_run - time.monotonic()))
+
+            lag = time.monotonic() - next_run
+            job.last_lag = lag
+            job.max_lag = max(job.max_lag, lag)
+            next_run = max(next_run + self._next_delay(job), time.monotonic())
+
+            if job.running:
+                if job.overlap == "skip":
+                    job.skipped += 1
+                    print(f"Skipping job {job.name}: previous run still in progress")
+                    continue
+                if job.overlap == "cancel":
+                    for task in job.running:
+                        task.cancel()
+
+            task = asyncio.create_task(self._run(job))
+            job.running.add(task)
+            task.add_done_callback(job.running.discard)
+
+    async def _run(self, job: Job):
+        started = time.monotonic()
+        job.last_started = time.time()
+        job.runs += 1
+        try:
+            if job.timeout is not None:
+                await asyncio.wait_for(job.func(), timeout=job.timeout)
+            else:
+                await job.func()
+        except asyncio.TimeoutError:
+            job.timeouts += 1
+            print(f"Job {job.name} timed out after {job.timeout}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.failures += 1
+            print(f"Job {job.name} error: {e}")
+        finally:
+            job.last_duration = time.monotonic() - started
+
+    async def stop(self):
+        tasks: List[asyncio.Task] = []
+        for job in self.jobs.values():
+            if job.loop_task is not None:
+                tasks.append(job.loop_task)
+                job.loop_task = None
+            tasks.extend(job.running)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> List[Dict]:
+        return [
+            {
+                "job": job.name,
+                "interval": job.interval,
+                "running": len(job.running),
+                "runs": job.runs,
+                "failures": job.failures,
+                "timeouts": job.timeouts,
+                "skipped": job.skipped,
+                "last_started": job.last_started,
+                "last_duration": job.last_duration,
+                "last_lag": job.last_lag,
+                "max_lag": job.max_lag
+            }
+            for job in self.jobs.values()
+        ]
@@ -0,0 +1,329 @@
+import asyncio
+import json
+import re
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import aiohttp
+
+from llm_scheduler import RateLimitGovernor
+from model_registry import ModelRegistry
+from prompt_builder import estimate_tokens
+
+GROQ_CHAT_URL = "https://api.groq.com/openai/v1/chat/completions"
+
+SENTENCE_END_PATTERN = re.compile(r"[.!?]+[\"')\]]*(?=\s)|\n+")
+
+
+def find_stream_cutoff(text: str, max_sentences: Optional[int] = None,
+                       max_chars: Optional[int] = None) -> Optional[str]:
+    if max_chars and len(text) >= max_chars:
+        cut = text[:max_chars]
+        space = cut.rfind(" ")
+        return (cut[:space] if space > 0 else cut).rstrip()
+
+    if max_sentences:
+        count = 0
+        for match in SENTENCE_END_PATTERN.finditer(text):
+            if match.start() == 0:
+                continue
+            count += 1
+            if count >= max_sentences:
+                return text[:match.end()].rstrip()
+
+    return None
+
+
+class StreamStats:
+    __slots__ = ("ttft_samples", "generation_samples", "streams", "early_stops")
+
+    def __init__(self, sample_size: int):
+        self.ttft_samples = deque(maxlen=sample_size)
+        self.generation_samples = deque(maxlen=sample_size)
+        self.streams = 0
+        self.early_stops = 0
+
+
+class LLMClient:
+
+    def __init__(self, api_key: str, base_url: str = GROQ_CHAT_URL, pool_size: int = 10,
+                 pool_size_per_host: int = 0, timeout: float = 30, connect_timeout: float = 10,
+                 keepalive_timeout: float = 60, latency_sample_size: int = 200,
+                 registry: Optional[ModelRegistry] = None, governor: Optional[RateLimitGovernor] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.pool_size_per_host = pool_size_per_host
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_lock = asyncio.Lock()
+        self.latency_samples = deque(maxlen=latency_sample_size)
+        self.registry = registry
+        self.governor = governor
+        self.latency_sample_size = latency_sample_size
+        self.stream_stats: Dict[str, StreamStats] = {}
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is not None and not self._session.closed:
+            return self._session
+
+        async with self._session_lock:
+            if self._session is None or self._session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=self.pool_size,
+                    limit_per_host=self.pool_size_per_host,
+                    keepalive_timeout=self.keepalive_timeout,
+                    ttl_dns_cache=300
+                )
+                self._session = aiohttp.ClientSession(
+                    connector=connector,
+                    headers=self._headers(),
+                    timeout=aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout)
+                )
+        return self._session
+
+    def _estimate_request_tokens(self, data: Dict) -> int:
+        prompt = sum(estimate_tokens(msg.get("content") or "") for msg in data.get("messages", []))
+        return prompt + data.get("max_tokens", 0)
+
+    async def _acquire(self, data: Dict) -> bool:
+        model = data.get("model")
+        if self.governor is None or not model:
+            return True
+        return await self.governor.acquire(model, self._estimate_request_tokens(data))
+
+    def _request_timeout(self, timeout: Optional[float]) -> Optional[aiohttp.ClientTimeout]:
+        if timeout is None:
+            return None
+        return aiohttp.ClientTimeout(total=timeout, connect=self.connect_timeout)
+
+    async def chat_completion(self, data: Dict, timeout: Optional[float] = None) -> Tuple[int, Optional[Dict], Dict]:
+        model = data.get("model")
+        if not await self._acquire(data):
+            return 429, None, {}
+
+        session = await self._get_session()
+        request_timeout = self._request_timeout(timeout)
+
+        async with session.post(self.base_url, data=json.dumps(data), timeout=request_timeout) as response:
+            headers = dict(response.headers)
+            if self.governor is not None and model:
+                self.governor.update(model, response.status, headers)
+            if response.status != 200:
+                await response.read()
+                return response.status, None, headers
+
+            body = await response.text()
+            return response.status, json.loads(body), headers
+
+    async def stream_chat_completion(self, data: Dict, timeout: Optional[float] = None,
+                                     max_sentences: Optional[int] = None,
+                                     max_chars: Optional[int] = None) -> Tuple[int, Optional[Dict], Dict]:
+        model = data.get("model")
+        if not await self._acquire(data):
+            return 429, None, {}
+
+        session = await self._get_session()
+        payload = dict(data, stream=True, stream_options={"include_usage": True})
+        started = time.monotonic()
+        first_token_at = None
+        parts: List[str] = []
+        usage = None
+        stopped_early = False
+
+        async with session.post(self.base_url, data=json.dumps(payload),
+                                timeout=self._request_timeout(timeout)) as response:
+            headers = dict(response.headers)
+            if self.governor is not None and model:
+                self.governor.update(model, response.status, headers)
+            if response.status != 200:
+                await response.read()
+                return response.status, None, headers
+
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+
+                chunk_data = line[5:].strip()
+                if chunk_data == "[DONE]":
+                    break
+
+                chunk = json.loads(chunk_data)
+                usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage") or usage
+
+                for choice in chunk.get("choices") or []:
+                    delta = (choice.get("delta") or {}).get("content")
+                    if delta:
+                        if first_token_at is None:
+                            first_token_at = time.monotonic()
+                        parts.append(delta)
+
+                if parts and (max_sentences or max_chars):
+                    cutoff = find_stream_cutoff("".join(parts), max_sentences, max_chars)
+                    if cutoff is not None:
+                        parts = [cutoff]
+                        stopped_early = True
+                        response.close()
+                        break
+
+        finished = time.monotonic()
+        stats = self.stream_stats.get(model)
+        if stats is None:
+            stats = self.stream_stats[model] = StreamStats(self.latency_sample_size)
+        stats.streams += 1
+        stats.generation_samples.append(finished - started)
+        if first_token_at is not None:
+            stats.ttft_samples.append(first_token_at - started)
+        if stopped_early:
+            stats.early_stops += 1
+            print(f"Stopped {model} stream early after {finished - started:.2f}s")
+
+        content = "".join(parts)
+        return 200, {"choices": [{"message": {"content": content}}], "usage": usage}, headers
+
+    def get_stream_stats(self) -> List[Dict]:
+        def average(samples):
+            return sum(samples) / len(samples) if samples else None
+
+        return [
+            {
+                "model": model,
+                "streams": stats.streams,
+                "early_stops": stats.early_stops,
+                "avg_ttft": average(stats.ttft_samples),
+                "avg_generation_time": average(stats.generation_samples)
+            }
+            for model, stats in self.stream_stats.items()
+        ]
+
+    def get_hedge_delay(self, percentile: float = 0.9, default: float = 4.0,
+                        min_delay: float = 0.5, min_samples: int = 10) -> float:
+        if len(self.latency_samples) < min_samples:
+            return default
+
+        samples = sorted(self.latency_samples)
+        index = min(len(samples) - 1, int(percentile * len(samples)))
+        return max(min_delay, samples[index])
+
+    def _record_failure(self, model: str, started: float):
+        if self.registry is not None:
+            self.registry.record_failure(model, time.monotonic() - started)
+
+    async def _attempt_completion(self, data: Union[Dict, Callable[[str], Dict]], model: str,
+                                  timeout: Optional[float], stream: Optional[Dict] = None
+                                  ) -> Tuple[Optional[str], str, Optional[Dict]]:
+        payload = data(model) if callable(data) else data.copy()
+        payload["model"] = model
+        started = time.monotonic()
+
+        try:
+            if stream is not None:
+                status, result, _ = await self.stream_chat_completion(payload, timeout=timeout, **stream)
+            else:
+                status, result, _ = await self.chat_completion(payload, timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"Model {model} timed out")
+            self._record_failure(model, started)
+            return None, model, None
+        except aiohttp.ClientError as e:
+            print(f"Model {model} request failed: {str(e)}")
+            self._record_failure(model, started)
+            return None, model, None
+        except json.JSONDecodeError:
+            print(f"Model {model} returned invalid JSON")
+            self._record_failure(model, started)
+            return None, model, None
+        except Exception as e:
+            print(f"Model {model} unexpected error: {str(e)}")
+            self._record_failure(model, started)
+            return None, model, None
+
+        if status == 429 and self.governor is not None:
+            print(f"Model {model} is rate limited")
+            return None, model, None
+
+        if status != 200:
+            print(f"Model {model} failed with status {status}")
+            self._record_failure(model, started)
+            return None, model, None
+
+        content = None
+        if result and result.get('choices'):
+            content = (result['choices'][0].get('message') or {}).get('content')
+
+        if not content or not content.strip():
+            print(f"Model {model} returned empty response")
+            self._record_failure(model, started)
+            return None, model, None
+
+        latency = time.monotonic() - started
+        self.latency_samples.append(latency)
+        if self.registry is not None:
+            self.registry.record_success(model, latency)
+        return content, model, result.get('usage')
+
+    async def hedged_chat_completion(self, data: Union[Dict, Callable[[str], Dict]], models: List[str],
+                                     max_in_flight: int = 2, hedge_delay: Optional[float] = None,
+                                     timeout: Optional[float] = None, stream: Optional[Dict] = None
+                                     ) -> Tuple[Optional[str], Optional[str], Optional[Dict]]:
+        if hedge_delay is None:
+            hedge_delay = self.get_hedge_delay()
+
+        remaining = list(models)
+        pending = set()
+        last_launch = 0.0
+
+        def launch():
+            nonlocal last_launch
+            model = remaining.pop(0)
+            pending.add(asyncio.create_task(self._attempt_completion(data, model, timeout, stream)))
+            last_launch = time.monotonic()
+
+        try:
+            while remaining or pending:
+                if remaining and not pending:
+                    launch()
+
+                wait_for = max(0.0, hedge_delay - (time.monotonic() - last_launch))
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=wait_for if remaining and len(pending) < max_in_flight else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    print(f"No response within {hedge_delay:.2f}s, hedging with {remaining[0]}")
+                    launch()
+                    continue
+
+                for task in done:
+                    pending.discard(task)
+                    content, model, usage = task.result()
+                    if content is not None:
+                        return content, model, usage
+
+                for _ in done:
+                    if not remaining or len(pending) >= max_in_flight:
+                        break
+                    print(f"Attempt failed, hedging with {remaining[0]}")
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return None, None, None
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,270 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+PRIORITY_CLASSES = {
+    "dm": 0,
+    "mentioned": 0,
+    "reply-to-bot": 1,
+    "trigger": 2,
+    "conversation": 3,
+    "passive": 4
+}
+
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    matches = DURATION_PATTERN.findall(value)
+    if not matches:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in matches)
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "tokens", "rate", "updated")
+
+    def __init__(self):
+        self.capacity: Optional[float] = None
+        self.tokens = 0.0
+        self.rate = 0.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.capacity is None:
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def update(self, limit: Optional[str], remaining: Optional[str], reset: Optional[str],
+               fallback_window: float = 60):
+        try:
+            limit_value = float(limit) if limit is not None else None
+            remaining_value = float(remaining) if remaining is not None else None
+        except ValueError:
+            return
+        if remaining_value is None:
+            return
+
+        now = time.monotonic()
+        self.capacity = limit_value if limit_value is not None else max(remaining_value, self.capacity or 0)
+        self.tokens = remaining_value
+        self.updated = now
+
+        reset_seconds = parse_duration(reset)
+        missing = self.capacity - remaining_value
+        if reset_seconds and missing > 0:
+            self.rate = missing / reset_seconds
+        elif not self.rate:
+            self.rate = self.capacity / fallback_window
+
+    def wait_time(self, cost: float) -> float:
+        if self.capacity is None:
+            return 0.0
+
+        self._refill(time.monotonic())
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (cost - self.tokens) / self.rate
+
+    def consume(self, cost: float):
+        if self.capacity is not None:
+            self.tokens -= min(cost, self.capacity)
+
+
+class ModelRateLimit:
+    __slots__ = ("requests", "tokens", "blocked_until", "throttled", "rejected", "limited_responses")
+
+    def __init__(self):
+        self.requests = TokenBucket()
+        self.tokens = TokenBucket()
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self.rejected = 0
+        self.limited_responses = 0
+
+
+class RateLimitGovernor:
+
+    def __init__(self, max_wait: float = 10.0, default_retry_after: float = 2.0):
+        self.max_wait = max_wait
+        self.default_retry_after = default_retry_after
+        self.limits: Dict[str, ModelRateLimit] = {}
+
+    def _limits_for(self, model: str) -> ModelRateLimit:
+        if model not in self.limits:
+            self.limits[model] = ModelRateLimit()
+        return self.limits[model]
+
+    def update(self, model: str, status: int, headers: Dict[str, str]):
+        limits = self._limits_for(model)
+        headers = {key.lower(): value for key, value in headers.items()}
+
+        limits.requests.update(
+            headers.get("x-ratelimit-limit-requests"),
+            headers.get("x-ratelimit-remaining-requests"),
+            headers.get("x-ratelimit-reset-requests")
+        )
+        limits.tokens.update(
+            headers.get("x-ratelimit-limit-tokens"),
+            headers.get("x-ratelimit-remaining-tokens"),
+            headers.get("x-ratelimit-reset-tokens")
+        )
+
+        if status == 429:
+            limits.limited_responses += 1
+            retry_after = parse_duration(headers.get("retry-after")) or self.default_retry_after
+            limits.blocked_until = max(limits.blocked_until, time.monotonic() + retry_after)
+            print(f"Rate limited on {model}, backing off for {retry_after:.1f}s")
+
+    def wait_time(self, model: str, tokens: float = 0) -> float:
+        limits = self._limits_for(model)
+        blocked = max(0.0, limits.blocked_until - time.monotonic())
+        return max(blocked, limits.requests.wait_time(1), limits.tokens.wait_time(tokens))
+
+    async def acquire(self, model: str, tokens: float = 0, max_wait: Optional[float] = None) -> bool:
+        if max_wait is None:
+            max_wait = self.max_wait
+
+        limits = self._limits_for(model)
+        deadline = time.monotonic() + max_wait
+        wait = self.wait_time(model, tokens)
+        if wait > 0:
+            limits.throttled += 1
+
+        while wait > 0:
+            if time.monotonic() + wait > deadline:
+                limits.rejected += 1
+                print(f"Skipping {model}: rate limit clears in {wait:.1f}s")
+                return False
+            await asyncio.sleep(wait)
+            wait = self.wait_time(model, tokens)
+
+        limits.requests.consume(1)
+        limits.tokens.consume(tokens)
+        return True
+
+    def stats(self) -> Dict[str, Dict]:
+        now = time.monotonic()
+        return {
+            model: {
+                "requests_remaining": limits.requests.tokens if limits.requests.capacity is not None else None,
+                "tokens_remaining": limits.tokens.tokens if limits.tokens.capacity is not None else None,
+                "blocked_for": max(0.0, limits.blocked_until - now),
+                "throttled": limits.throttled,
+                "rejected": limits.rejected,
+                "rate_limited_responses": limits.limited_responses
+            }
+            for model, limits in self.limits.items()
+        }
+
+
+class LLMScheduler:
+
+    def __init__(self, max_concurrency: int = 4, wait_sample_size: int = 200):
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._queues: Dict[int, "OrderedDict[Optional[str], deque]"] = {}
+        self._queued = 0
+        self.wait_samples: Dict[int, deque] = {}
+        self.wait_sample_size = wait_sample_size
+        self.submitted = 0
+        self.completed = 0
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        for level in sorted(self._queues):
+            channels = self._queues[level]
+            while channels:
+                channel_id, waiters = next(iter(channels.items()))
+                future = waiters.popleft()
+                self._queued -= 1
+                if waiters:
+                    channels.move_to_end(channel_id)
+                else:
+                    del channels[channel_id]
+                if not future.done():
+                    return future
+        return None
+
+    def _dispatch(self):
+        while self.in_flight < self.max_concurrency:
+            future = self._next_waiter()
+            if future is None:
+                return
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _release(self):
+        self.in_flight -= 1
+        self.completed += 1
+        self._dispatch()
+
+    async def submit(self, factory: Callable[[], Awaitable[T]], priority: str = "trigger",
+                     channel_id: Optional[str] = None) -> T:
+        level = PRIORITY_CLASSES.get(priority, len(PRIORITY_CLASSES))
+        queued_at = time.monotonic()
+        self.submitted += 1
+
+        future = asyncio.get_running_loop().create_future()
+        channels = self._queues.setdefault(level, OrderedDict())
+        channels.setdefault(channel_id, deque()).append(future)
+        self._queued += 1
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+        waited = time.monotonic() - queued_at
+        if waited > 1:
+            print(f"LLM request for {channel_id} ({priority}) waited {waited:.1f}s in queue")
+
+        samples = self.wait_samples.setdefault(level, deque(maxlen=self.wait_sample_size))
+        samples.append(waited)
+
+        try:
+            return await factory()
+        finally:
+            self._release()
+
+    def stats(self) -> Dict:
+        by_class = {}
+        for level in sorted(set(PRIORITY_CLASSES.values())):
+            name = "/".join(key for key, value in PRIORITY_CLASSES.items() if value == level)
+            channels = self._queues.get(level, {})
+            samples = sorted(self.wait_samples.get(level, ()))
+            by_class[name] = {
+                "queued": sum(len(waiters) for waiters in channels.values()),
+                "channels": len(channels),
+                "avg_wait": sum(samples) / len(samples) if samples else 0.0,
+                "p90_wait": samples[int(0.9 * (len(samples) - 1))] if samples else 0.0,
+                "max_wait": samples[-1] if samples else 0.0
+            }
+
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self._queued,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "classes": by_class
+        }
@@ -0,0 +1,158 @@
+import math
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class RelevanceIndex:
+
+    def __init__(self, dimensions: int = 2 ** 18, initial_capacity: int = 4096):
+        self.dimensions = dimensions
+        self._rows = np.empty(initial_capacity, dtype=np.int64)
+        self._features = np.empty(initial_capacity, dtype=np.int32)
+        self._weights = np.empty(initial_capacity, dtype=np.float32)
+        self._channels = np.empty(initial_capacity, dtype=np.int32)
+        self._guilds = np.empty(initial_capacity, dtype=np.int32)
+        self._scope_codes: Dict[str, int] = {}
+        self._doc_freq = np.zeros(dimensions, dtype=np.int32)
+        self._query_mask = np.zeros(dimensions, dtype=bool)
+        self._query_weights = np.zeros(dimensions, dtype=np.float32)
+        self._start = 0
+        self._end = 0
+        self._first_row = 0
+        self._next_row = 0
+
+    @staticmethod
+    def available() -> bool:
+        return np is not None
+
+    @property
+    def document_count(self) -> int:
+        return self._next_row - self._first_row
+
+    def _hash(self, token: str) -> int:
+        return zlib.crc32(token.encode("utf-8")) % self.dimensions
+
+    def _scope_code(self, scope_id: Optional[str]) -> int:
+        if scope_id is None:
+            return 0
+        code = self._scope_codes.get(scope_id)
+        if code is None:
+            code = self._scope_codes[scope_id] = len(self._scope_codes) + 1
+        return code
+
+    def _vectorize(self, tokens: List[str]):
+        counts = Counter(self._hash(token) for token in tokens)
+        features = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        weights = np.fromiter((1 + math.log(count) for count in counts.values()),
+                              dtype=np.float32, count=len(counts))
+        return features, weights
+
+    def _reserve(self, extra: int):
+        if self._end + extra <= len(self._rows):
+            return
+
+        live = self._end - self._start
+        capacity = len(self._rows)
+        while live + extra > capacity // 2:
+            capacity *= 2
+
+        for name in ("_rows", "_features", "_weights", "_channels", "_guilds"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:live] = old[self._start:self._end]
+            setattr(self, name, new)
+
+        self._start = 0
+        self._end = live
+
+    def add(self, row: int, tokens: List[str], channel_id: Optional[str] = None,
+            guild_id: Optional[str] = None):
+        self._next_row = row + 1
+        if not tokens:
+            return
+
+        features, weights = self._vectorize(tokens)
+        weights /= np.linalg.norm(weights)
+
+        count = len(features)
+        self._reserve(count)
+        self._rows[self._end:self._end + count] = row
+        self._features[self._end:self._end + count] = features
+        self._weights[self._end:self._end + count] = weights
+        self._channels[self._end:self._end + count] = self._scope_code(channel_id)
+        self._guilds[self._end:self._end + count] = self._scope_code(guild_id)
+        self._end += count
+        np.add.at(self._doc_freq, features, 1)
+
+    def evict_before(self, row: int):
+        self._first_row = max(self._first_row, row)
+        stop = self._start + int(np.searchsorted(self._rows[self._start:self._end], row))
+        if stop > self._start:
+            np.subtract.at(self._doc_freq, self._features[self._start:stop], 1)
+            self._start = stop
+
+    def query(self, tokens: List[str], top_k: int = 8, min_row: Optional[int] = None,
+              min_score: float = 0.0, channel_ids: Optional[Iterable[str]] = None,
+              guild_id: Optional[str] = None, exclude_rows: Optional[Iterable[int]] = None) -> List[int]:
+        if not tokens or self._end == self._start:
+            return []
+
+        query_features, query_weights = self._vectorize(tokens)
+        documents = max(1, self.document_count)
+        idf = np.log((1 + documents) / (1 + self._doc_freq[query_features])).astype(np.float32) + 1
+        query_weights *= idf
+
+        start = self._start
+        if min_row is not None and min_row > self._first_row:
+            start += int(np.searchsorted(self._rows[self._start:self._end], min_row))
+        if start >= self._end:
+            return []
+
+        features = self._features[start:self._end]
+        self._query_mask[query_features] = True
+        self._query_weights[query_features] = query_weights
+        try:
+            matched = np.flatnonzero(np.take(self._query_mask, features))
+            contributions = (np.take(self._query_weights, features[matched])
+                             * self._weights[start:self._end][matched])
+        finally:
+            self._query_mask[query_features] = False
+            self._query_weights[query_features] = 0
+
+        if channel_ids is not None or guild_id is not None:
+            in_scope = np.zeros(matched.size, dtype=bool)
+            channel_codes = [self._scope_codes[channel] for channel in channel_ids or ()
+                             if channel in self._scope_codes]
+            if channel_codes:
+                in_scope |= np.isin(self._channels[start:self._end][matched], channel_codes)
+            if guild_id in self._scope_codes:
+                in_scope |= self._guilds[start:self._end][matched] == self._scope_codes[guild_id]
+            matched = matched[in_scope]
+            contributions = contributions[in_scope]
+
+        if matched.size == 0:
+            return []
+
+        rows = self._rows[start:self._end][matched]
+        base_row = int(rows[0])
+        scores = np.bincount(rows - base_row, weights=contributions)
+
+        for row in exclude_rows or ():
+            if 0 <= row - base_row < len(scores):
+                scores[row - base_row] = 0
+
+        candidates = np.flatnonzero(scores > min_score)
+        if candidates.size == 0:
+            return []
+        if candidates.size > top_k:
+            best = np.argpartition(scores[candidates], -top_k)[-top_k:]
+            candidates = candidates[best]
+
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [base_row + int(offset) for offset in ranked]
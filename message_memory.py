@@ -1,25 +1,315 @@
+import bisect
+import heapq
 import json
 import os
+import re
+import sys
+import threading
 import time
-from typing import Dict, List, Optional
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
 from datetime import datetime, timedelta
 
+from memory_relevance import RelevanceIndex
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def intern_value(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def tokenize(text: str) -> List[str]:
+    return list(dict.fromkeys(TOKEN_PATTERN.findall(text.lower())))
+
+
+def format_memory_context(messages: List[Dict]) -> str:
+    if not messages:
+        return ""
+    
+    context_lines = ["\n=== LEARNED MESSAGES FOR CONTEXT ==="]
+    
+    for msg in messages:
+        timestamp_str = datetime.fromtimestamp(msg["timestamp"]).strftime("%Y-%m-%d %H:%M")
+        context_lines.append(
+            f"[{timestamp_str}] {msg['user_name']}: {msg['message']}"
+        )
+    
+    context_lines.append("=== END CONTEXT ===\n")
+    
+    return "\n".join(context_lines)
+
+
+class MessageRecord:
+    __slots__ = ("message", "user_name", "channel_id", "guild_id", "type", "timestamp",
+                 "ordinal", "raw_id")
+    
+    def __init__(self, message: str, user_name: str, channel_id: Optional[str],
+                 guild_id: Optional[str], message_type: str, timestamp: float, ordinal: int,
+                 raw_id: Optional[str] = None):
+        self.message = message
+        self.user_name = intern_value(user_name)
+        self.channel_id = intern_value(channel_id)
+        self.guild_id = intern_value(guild_id)
+        self.type = intern_value(message_type)
+        self.timestamp = timestamp
+        self.ordinal = ordinal
+        self.raw_id = raw_id
+    
+    @classmethod
+    def from_dict(cls, entry: Dict) -> "MessageRecord":
+        ordinal = 0
+        raw_id = entry.get("id")
+        if raw_id is not None:
+            prefix = f"{entry['timestamp']}_{entry['user_name']}_"
+            suffix = raw_id[len(prefix):]
+            if raw_id.startswith(prefix) and suffix.isdigit():
+                ordinal = int(suffix)
+                raw_id = None
+        
+        return cls(
+            entry["message"],
+            entry["user_name"],
+            entry.get("channel_id"),
+            entry.get("guild_id"),
+            entry.get("type", "user"),
+            entry["timestamp"],
+            ordinal,
+            raw_id
+        )
+    
+    @property
+    def id(self) -> str:
+        return self.raw_id or f"{self.timestamp}_{self.user_name}_{self.ordinal}"
+    
+    @property
+    def date(self) -> str:
+        return datetime.fromtimestamp(self.timestamp).isoformat()
+    
+    def __getitem__(self, key: str):
+        return getattr(self, key)
+    
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "message": self.message,
+            "user_name": self.user_name,
+            "channel_id": self.channel_id,
+            "guild_id": self.guild_id,
+            "type": self.type,
+            "timestamp": self.timestamp,
+            "date": self.date
+        }
+
+
+class MessageAggregate:
+    __slots__ = ("count", "first_timestamp", "last_timestamp", "bytes_stored",
+                 "user_messages", "assistant_messages")
+    
+    def __init__(self):
+        self.count = 0
+        self.first_timestamp: Optional[float] = None
+        self.last_timestamp: Optional[float] = None
+        self.bytes_stored = 0
+        self.user_messages = 0
+        self.assistant_messages = 0
+    
+    def add(self, msg: "MessageRecord", size: int):
+        self.count += 1
+        self.bytes_stored += size
+        if msg.type == "assistant":
+            self.assistant_messages += 1
+        else:
+            self.user_messages += 1
+        if self.first_timestamp is None or msg.timestamp < self.first_timestamp:
+            self.first_timestamp = msg.timestamp
+        if self.last_timestamp is None or msg.timestamp > self.last_timestamp:
+            self.last_timestamp = msg.timestamp
+    
+    def remove(self, msg: "MessageRecord", size: int, next_timestamp: Optional[float]):
+        self.count -= 1
+        self.bytes_stored -= size
+        if msg.type == "assistant":
+            self.assistant_messages -= 1
+        else:
+            self.user_messages -= 1
+        self.first_timestamp = next_timestamp
+    
+    def to_dict(self) -> Dict:
+        return {
+            "total_messages": self.count,
+            "first_message": datetime.fromtimestamp(self.first_timestamp).isoformat() if self.count else None,
+            "last_message": datetime.fromtimestamp(self.last_timestamp).isoformat() if self.count else None,
+            "bytes_stored": self.bytes_stored,
+            "user_messages": self.user_messages,
+            "assistant_messages": self.assistant_messages
+        }
+
+
+class MessageJournal:
+
+    FSYNC_POLICIES = ("always", "interval", "never")
+
+    def __init__(self, snapshot_file: str, journal_file: Optional[str] = None,
+                 fsync_policy: str = "interval", fsync_interval: float = 1.0):
+        if fsync_policy not in self.FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {self.FSYNC_POLICIES}")
+
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file or f"{snapshot_file}.journal"
+        self.rotated_file = f"{self.journal_file}.compacting"
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.seq = 0
+        self.appends_since_compaction = 0
+        self.last_compaction = time.time()
+        self._last_fsync = time.time()
+        self._file = None
+        self._compact_thread: Optional[threading.Thread] = None
+
+    def load(self) -> Tuple[Optional[Dict], List[Dict]]:
+        snapshot = None
+        if os.path.exists(self.snapshot_file):
+            try:
+                with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                print(f"Warning: Could not load memory from {self.snapshot_file}, creating new memory")
+
+        snapshot_seq = 0
+        if snapshot is not None:
+            snapshot_seq = snapshot.get("metadata", {}).get("journal_seq", 0)
+        self.seq = snapshot_seq
+
+        records = []
+        for path in (self.rotated_file, self.journal_file):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"Warning: Skipping corrupt journal line in {path}")
+                        continue
+                    if record.get("seq", 0) <= snapshot_seq:
+                        continue
+                    records.append(record)
+                    self.seq = max(self.seq, record["seq"])
+
+        self.appends_since_compaction = len(records)
+        return snapshot, records
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.journal_file, 'a', encoding='utf-8')
+        return self._file
+
+    def append(self, op: str, **fields):
+        self.seq += 1
+        record = {"seq": self.seq, "op": op}
+        record.update(fields)
+
+        f = self._open()
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+
+        if self.fsync_policy == "always" or (
+                self.fsync_policy == "interval" and time.time() - self._last_fsync >= self.fsync_interval):
+            os.fsync(f.fileno())
+            self._last_fsync = time.time()
+
+        self.appends_since_compaction += 1
+
+    def is_compacting(self) -> bool:
+        return self._compact_thread is not None and self._compact_thread.is_alive()
+
+    def compact(self, snapshot: Dict, wait: bool = False):
+        if self.is_compacting():
+            self._compact_thread.join()
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        if os.path.exists(self.journal_file):
+            if os.path.exists(self.rotated_file):
+                with open(self.journal_file, 'r', encoding='utf-8') as src, \
+                        open(self.rotated_file, 'a', encoding='utf-8') as dst:
+                    dst.write(src.read())
+                os.remove(self.journal_file)
+            else:
+                os.replace(self.journal_file, self.rotated_file)
+
+        snapshot["metadata"]["journal_seq"] = self.seq
+        self.appends_since_compaction = 0
+        self.last_compaction = time.time()
+
+        self._compact_thread = threading.Thread(
+            target=self._write_snapshot, args=(snapshot,), daemon=True
+        )
+        self._compact_thread.start()
+
+        if wait:
+            self._compact_thread.join()
+
+    def _write_snapshot(self, snapshot: Dict):
+        tmp_file = f"{self.snapshot_file}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, default=MessageRecord.to_dict)
+                f.flush()
+                if self.fsync_policy != "never":
+                    os.fsync(f.fileno())
+            os.replace(tmp_file, self.snapshot_file)
+
+            if os.path.exists(self.rotated_file):
+                os.remove(self.rotated_file)
+        except Exception as e:
+            print(f"Error compacting memory to {self.snapshot_file}: {e}")
+
+    def close(self):
+        if self.is_compacting():
+            self._compact_thread.join()
+        if self._file is not None:
+            if self.fsync_policy != "never":
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+
 class MessageMemory:
     
-    def __init__(self, memory_file: str = "message_memory.json", max_memory_items: int = 1000):
+    def __init__(self, memory_file: str = "message_memory.json", max_memory_items: int = 1000,
+                 journal_file: Optional[str] = None, fsync_policy: str = "interval",
+                 fsync_interval: float = 1.0, compact_every: int = 500, compact_interval: float = 3600,
+                 context_quotas: Optional[Dict[str, int]] = None, relevance_top_k: int = 8,
+                 relevance_recency_tail: int = 4,
+                 search_min_prefix: int = 3):
         self.memory_file = memory_file
+        self.context_quotas = context_quotas or {"channel": 8, "guild": 4, "dm": 3}
+        self.relevance_top_k = relevance_top_k
+        self.relevance_recency_tail = relevance_recency_tail
+        self.search_min_prefix = search_min_prefix
+        self.context_cache_hits = 0
+        self.context_cache_misses = 0
         self.max_memory_items = max_memory_items
+        self.compact_every = compact_every
+        self.compact_interval = compact_interval
+        self.journal = MessageJournal(
+            memory_file,
+            journal_file=journal_file,
+            fsync_policy=fsync_policy,
+            fsync_interval=fsync_interval
+        )
+        self._reset_indexes()
         self.memory_data = self._load_memory()
     
-    def _load_memory(self) -> Dict:
-        if os.path.exists(self.memory_file):
-            try:
-                with open(self.memory_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    return data
-            except (json.JSONDecodeError, FileNotFoundError):
-                print(f"Warning: Could not load memory from {self.memory_file}, creating new memory")
-        
+    def _empty_memory(self) -> Dict:
         return {
             "messages": [],
             "metadata": {
@@ -29,132 +319,420 @@ class MessageMemory:
             }
         }
     
-    def _save_memory(self):
+    def _load_memory(self) -> Dict:
+        snapshot, records = self.journal.load()
+        self.memory_data = snapshot if snapshot is not None else self._empty_memory()
+        self.memory_data["messages"] = sorted(
+            (MessageRecord.from_dict(entry) for entry in self.memory_data["messages"]),
+            key=lambda record: record.timestamp
+        )
+        self._rebuild_indexes()
+        
+        for record in records:
+            if record["op"] == "add":
+                self._apply_entry(MessageRecord.from_dict(record["entry"]))
+            elif record["op"] == "clear":
+                self.memory_data = self._empty_memory()
+                self._reset_indexes()
+        
+        return self.memory_data
+    
+    def _reset_indexes(self):
+        self._base = 0
+        self._timestamps: List[float] = []
+        self._user_positions: Dict[str, deque] = {}
+        self._channel_positions: Dict[str, deque] = {}
+        self._guild_positions: Dict[str, deque] = {}
+        self._token_positions: Dict[str, deque] = {}
+        self._vocabulary: List[str] = []
+        self._user_stats: Dict[str, MessageAggregate] = {}
+        self._channel_stats: Dict[str, MessageAggregate] = {}
+        self._generations: Dict[Optional[Tuple[str, str]], int] = {}
+        self._context_cache: Dict[Tuple, Tuple] = {}
+        self._relevance = RelevanceIndex() if RelevanceIndex.available() else None
+    
+    def _rebuild_indexes(self):
+        self._reset_indexes()
+        for pos, msg in enumerate(self.memory_data["messages"]):
+            self._index_entry(msg, pos)
+    
+    def _index_entry(self, msg: MessageRecord, pos: int):
+        self._timestamps.append(msg.timestamp)
+        
+        for scope in (None, ("channel", msg.channel_id), ("guild", msg.guild_id)):
+            self._generations[scope] = self._generations.get(scope, 0) + 1
+        
+        size = len(msg.message.encode("utf-8"))
+        self._user_stats.setdefault(msg.user_name, MessageAggregate()).add(msg, size)
+        self._channel_stats.setdefault(msg.channel_id, MessageAggregate()).add(msg, size)
+        self._user_positions.setdefault(msg.user_name, deque()).append(pos)
+        self._channel_positions.setdefault(msg.channel_id, deque()).append(pos)
+        if msg.guild_id is not None:
+            self._guild_positions.setdefault(msg.guild_id, deque()).append(pos)
+        
+        tokens = TOKEN_PATTERN.findall(msg.message.lower())
+        for token in dict.fromkeys(tokens):
+            positions = self._token_positions.get(token)
+            if positions is None:
+                positions = self._token_positions[token] = deque()
+                bisect.insort(self._vocabulary, token)
+            positions.append(pos)
+        
+        if self._relevance is not None:
+            self._relevance.add(pos, tokens, msg.channel_id, msg.guild_id)
+    
+    def _unindex_entry(self, msg: MessageRecord, pos: int):
+        size = len(msg.message.encode("utf-8"))
+        messages = self.memory_data["messages"]
+        
+        for index, stats, key in ((self._user_positions, self._user_stats, msg.user_name),
+                                  (self._channel_positions, self._channel_stats, msg.channel_id)):
+            positions = index.get(key)
+            if positions and positions[0] == pos:
+                positions.popleft()
+                if not positions:
+                    del index[key]
+                    del stats[key]
+                else:
+                    stats[key].remove(msg, size, messages[positions[0] - self._base].timestamp)
+        
+        guild_positions = self._guild_positions.get(msg.guild_id)
+        if guild_positions and guild_positions[0] == pos:
+            guild_positions.popleft()
+            if not guild_positions:
+                del self._guild_positions[msg.guild_id]
+        
+        for token in tokenize(msg.message):
+            positions = self._token_positions.get(token)
+            if positions and positions[0] == pos:
+                positions.popleft()
+                if not positions:
+                    del self._token_positions[token]
+                    del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+    
+    def _evict(self, count: int):
+        messages = self.memory_data["messages"]
+        for offset in range(count):
+            self._unindex_entry(messages[offset], self._base + offset)
+        
+        del messages[:count]
+        del self._timestamps[:count]
+        self._base += count
+        
+        if self._relevance is not None:
+            self._relevance.evict_before(self._base)
+    
+    def _apply_entry(self, message_entry: MessageRecord) -> int:
+        messages = self.memory_data["messages"]
+        
+        if not self._timestamps or message_entry.timestamp >= self._timestamps[-1]:
+            messages.append(message_entry)
+            pos = self._base + len(messages) - 1
+            self._index_entry(message_entry, pos)
+        else:
+            insert_at = bisect.bisect_right(self._timestamps, message_entry.timestamp)
+            messages.insert(insert_at, message_entry)
+            self._rebuild_indexes()
+            pos = self._base + insert_at
+        
+        if len(messages) > self.max_memory_items:
+            self._evict(len(messages) - self.max_memory_items)
+        
+        self.memory_data["metadata"]["total_messages"] = len(messages)
+        return pos
+    
+    def _snapshot(self) -> Dict:
+        return {
+            "messages": list(self.memory_data["messages"]),
+            "metadata": dict(self.memory_data["metadata"])
+        }
+    
+    def _maybe_compact(self):
+        if self.journal.is_compacting():
+            return
+        
+        if (self.journal.appends_since_compaction >= self.compact_every or
+                time.time() - self.journal.last_compaction >= self.compact_interval):
+            self.compact()
+    
+    def compact(self, wait: bool = False):
         try:
-            with open(self.memory_file, 'w', encoding='utf-8') as f:
-                json.dump(self.memory_data, f, indent=2, ensure_ascii=False)
+            self.journal.compact(self._snapshot(), wait=wait)
         except Exception as e:
-            print(f"Error saving memory to {self.memory_file}: {e}")
+            print(f"Error compacting memory to {self.memory_file}: {e}")
+    
+    def close(self, compact: bool = True):
+        if compact and self.journal.appends_since_compaction:
+            self.compact(wait=True)
+        self.journal.close()
     
     def add_message(self, message: str, user_name: str, channel_id: str, 
-                   message_type: str = "user", timestamp: Optional[float] = None):
+                   message_type: str = "user", timestamp: Optional[float] = None,
+                   guild_id: Optional[str] = None) -> Optional[int]:
         if not message or not message.strip():
-            return
+            return None
         
         if timestamp is None:
             timestamp = time.time()
         
-        message_entry = {
-            "id": f"{timestamp}_{user_name}_{len(self.memory_data['messages'])}",
-            "message": message.strip(),
-            "user_name": user_name,
-            "channel_id": channel_id,
-            "type": message_type,
-            "timestamp": timestamp,
-            "date": datetime.fromtimestamp(timestamp).isoformat()
-        }
+        message_entry = MessageRecord(
+            message.strip(),
+            user_name,
+            channel_id,
+            guild_id,
+            message_type,
+            timestamp,
+            len(self.memory_data["messages"])
+        )
         
-        self.memory_data["messages"].append(message_entry)
-        self.memory_data["metadata"]["total_messages"] = len(self.memory_data["messages"])
+        pos = self._apply_entry(message_entry)
         
-        if len(self.memory_data["messages"]) > self.max_memory_items:
-            excess = len(self.memory_data["messages"]) - self.max_memory_items
-            self.memory_data["messages"] = self.memory_data["messages"][excess:]
+        try:
+            self.journal.append("add", entry=message_entry.to_dict())
+        except Exception as e:
+            print(f"Error saving memory to {self.journal.journal_file}: {e}")
+            return pos
+        
+        self._maybe_compact()
+        return pos
+    
+    def _recent_positions(self, positions, cutoff_time: float, limit: int,
+                          exclude_channel: Optional[str] = None) -> List[int]:
+        recent_positions = []
+        messages = self.memory_data["messages"]
+        for pos in positions:
+            if len(recent_positions) >= limit:
+                break
+            if self._timestamps[pos - self._base] < cutoff_time:
+                break
+            if exclude_channel is not None and messages[pos - self._base].channel_id == exclude_channel:
+                continue
+            recent_positions.append(pos)
         
-        self._save_memory()
+        return recent_positions
     
     def get_recent_messages(self, limit: int = 10, hours: int = 24, 
                           user_name: Optional[str] = None) -> List[Dict]:
         cutoff_time = time.time() - (hours * 3600)
+        messages = self.memory_data["messages"]
+        
+        if user_name is None:
+            start = max(bisect.bisect_left(self._timestamps, cutoff_time), len(messages) - limit)
+            return [msg.to_dict() for msg in reversed(messages[start:])]
         
-        filtered_messages = [
-            msg for msg in self.memory_data["messages"]
-            if msg["timestamp"] >= cutoff_time and 
-            (user_name is None or msg["user_name"] == user_name)
+        positions = self._recent_positions(
+            reversed(self._user_positions.get(user_name, ())), cutoff_time, limit
+        )
+        return [messages[pos - self._base].to_dict() for pos in positions]
+    
+    def _cached_context(self, key: Tuple, generation: Tuple, cutoff_time: float) -> Optional[str]:
+        cached = self._context_cache.get(key)
+        if cached is None:
+            return None
+        
+        cached_generation, first_pos, oldest_timestamp, context = cached
+        if cached_generation != generation:
+            return None
+        if first_pos is not None and first_pos < self._base:
+            return None
+        if oldest_timestamp is not None and oldest_timestamp < cutoff_time:
+            return None
+        
+        return context
+    
+    def _scoped_positions(self, limit: int, cutoff_time: float, channel_id: Optional[str],
+                          guild_id: Optional[str], dm_channel_id: Optional[str]) -> List[int]:
+        scopes = [
+            ("channel", self._channel_positions.get(channel_id, ()), None),
+            ("guild", self._guild_positions.get(guild_id, ()), channel_id),
         ]
+        if dm_channel_id is not None and dm_channel_id != channel_id:
+            scopes.append(("dm", self._channel_positions.get(dm_channel_id, ()), None))
         
-        filtered_messages.sort(key=lambda x: x["timestamp"], reverse=True)
-        return filtered_messages[:limit]
+        positions = []
+        carry = 0
+        for scope, scope_positions, exclude_channel in scopes:
+            quota = min(self.context_quotas.get(scope, 0) + carry, limit - len(positions))
+            if quota <= 0:
+                continue
+            found = self._recent_positions(reversed(scope_positions), cutoff_time, quota, exclude_channel)
+            positions.extend(found)
+            carry = quota - len(found)
+        
+        positions.sort()
+        return positions
     
-    def get_memory_context(self, limit: int = 15, hours: int = 48) -> str:
-        recent_messages = self.get_recent_messages(limit=limit, hours=hours)
+    def _relevant_positions(self, query: str, cutoff_time: float, channel_id: Optional[str],
+                            guild_id: Optional[str], dm_channel_id: Optional[str],
+                            exclude: Tuple[int, ...]) -> List[int]:
+        min_row = self._base + bisect.bisect_left(self._timestamps, cutoff_time)
+        scoped = channel_id is not None or guild_id is not None or dm_channel_id is not None
         
-        if not recent_messages:
-            return ""
+        positions = set(self._relevance.query(
+            TOKEN_PATTERN.findall(query.lower()),
+            top_k=self.relevance_top_k,
+            min_row=min_row,
+            channel_ids=[channel for channel in (channel_id, dm_channel_id) if channel is not None] if scoped else None,
+            guild_id=guild_id,
+            exclude_rows=exclude
+        ))
         
-        context_lines = ["\n=== LEARNED MESSAGES FOR CONTEXT ==="]
+        tail = self.relevance_recency_tail + len(exclude)
+        if scoped:
+            positions.update(self._scoped_positions(tail, cutoff_time, channel_id, guild_id, dm_channel_id))
+        else:
+            newest = self._base + len(self.memory_data["messages"]) - 1
+            positions.update(self._recent_positions(range(newest, self._base - 1, -1), cutoff_time, tail))
         
-        for msg in reversed(recent_messages):
-            timestamp_str = datetime.fromtimestamp(msg["timestamp"]).strftime("%Y-%m-%d %H:%M")
-            context_lines.append(
-                f"[{timestamp_str}] {msg['user_name']}: {msg['message']}"
+        return sorted(positions.difference(exclude))
+    
+    def get_memory_context(self, limit: int = 15, hours: int = 48, channel_id: Optional[str] = None,
+                           guild_id: Optional[str] = None, dm_channel_id: Optional[str] = None,
+                           query: Optional[str] = None, exclude: Optional[Iterable[int]] = None) -> str:
+        cutoff_time = time.time() - (hours * 3600)
+        scoped = channel_id is not None or guild_id is not None or dm_channel_id is not None
+        relevance = bool(query) and self._relevance is not None
+        exclude = tuple(sorted(set(exclude))) if exclude else ()
+        
+        if scoped:
+            key = (limit, hours, (channel_id, guild_id, dm_channel_id, tuple(sorted(self.context_quotas.items()))))
+            generation = tuple(
+                self._generations.get(scope, 0)
+                for scope in (("channel", channel_id), ("guild", guild_id), ("channel", dm_channel_id))
             )
+        else:
+            key = (limit, hours, None)
+            generation = (self._generations.get(None, 0),)
+        if relevance:
+            key = ("relevance",) + key
+            generation += (query, exclude)
         
-        context_lines.append("=== END CONTEXT ===\n")
+        context = self._cached_context(key, generation, cutoff_time)
+        if context is not None:
+            self.context_cache_hits += 1
+            return context
         
-        return "\n".join(context_lines)
-    
-    def search_messages(self, query: str, user_name: Optional[str] = None) -> List[Dict]:
-        query_lower = query.lower()
-        matches = []
+        self.context_cache_misses += 1
+        if relevance:
+            positions = self._relevant_positions(query, cutoff_time, channel_id, guild_id, dm_channel_id, exclude)
+        elif scoped:
+            positions = self._scoped_positions(limit, cutoff_time, channel_id, guild_id, dm_channel_id)
+        else:
+            newest = self._base + len(self.memory_data["messages"]) - 1
+            positions = self._recent_positions(range(newest, self._base - 1, -1), cutoff_time, limit)
+            positions.reverse()
         
-        for msg in self.memory_data["messages"]:
-            if query_lower in msg["message"].lower():
-                if user_name is None or msg["user_name"] == user_name:
-                    matches.append(msg)
+        messages = [self.memory_data["messages"][pos - self._base] for pos in positions]
+        context = format_memory_context(messages)
+        self._context_cache[key] = (
+            generation,
+            positions[0] if positions else None,
+            min(msg.timestamp for msg in messages) if messages else None,
+            context
+        )
         
-        return matches
+        return context
     
-    def get_user_stats(self, user_name: str) -> Dict:
-        user_messages = [
-            msg for msg in self.memory_data["messages"]
-            if msg["user_name"] == user_name
-        ]
+    def _term_postings(self, term: str, prefix: bool) -> List[deque]:
+        if not prefix or len(term) < self.search_min_prefix:
+            positions = self._token_positions.get(term)
+            return [positions] if positions else []
         
-        if not user_messages:
-            return {
-                "user_name": user_name,
-                "total_messages": 0,
-                "first_message": None,
-                "last_message": None
-            }
-        
-        user_messages.sort(key=lambda x: x["timestamp"])
+        postings = []
+        vocabulary = self._vocabulary
+        for index in range(bisect.bisect_left(vocabulary, term), len(vocabulary)):
+            if not vocabulary[index].startswith(term):
+                break
+            postings.append(self._token_positions[vocabulary[index]])
+        return postings
+    
+    def _matches_terms(self, msg: MessageRecord, terms: List[str], prefix: bool) -> bool:
+        tokens = set(TOKEN_PATTERN.findall(msg.message.lower()))
+        for term in terms:
+            if term in tokens:
+                continue
+            if prefix and len(term) >= self.search_min_prefix and any(token.startswith(term) for token in tokens):
+                continue
+            return False
+        return True
+    
+    def search_messages(self, query: str, user_name: Optional[str] = None,
+                        channel_id: Optional[str] = None, since: Optional[float] = None,
+                        until: Optional[float] = None, prefix: bool = True,
+                        limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        terms = tokenize(query)
+        if not terms:
+            return []
         
-        return {
-            "user_name": user_name,
-            "total_messages": len(user_messages),
-            "first_message": user_messages[0]["date"],
-            "last_message": user_messages[-1]["date"]
-        }
+        drivers = []
+        for term in terms:
+            postings = self._term_postings(term, prefix)
+            if not postings:
+                return []
+            drivers.append(postings)
+        for index, key in ((self._user_positions, user_name), (self._channel_positions, channel_id)):
+            if key is not None:
+                positions = index.get(key)
+                if not positions:
+                    return []
+                drivers.append([positions])
+        driver = min(drivers, key=lambda postings: sum(len(positions) for positions in postings))
         
-        if not user_messages:
-            return {
-                "user_name": user_name,
-                "total_messages": 0,
-                "first_message": None,
-                "last_message": None
-            }
+        messages = self.memory_data["messages"]
+        low = self._base
+        high = self._base + len(messages)
+        if since is not None:
+            low = self._base + bisect.bisect_left(self._timestamps, since)
+        if until is not None:
+            high = self._base + bisect.bisect_right(self._timestamps, until)
         
-        user_messages.sort(key=lambda x: x["timestamp"])
+        matches = []
+        skipped = 0
+        last_pos = None
+        for pos in heapq.merge(*driver):
+            if pos == last_pos or pos < low:
+                continue
+            if pos >= high:
+                break
+            last_pos = pos
+            msg = messages[pos - self._base]
+            if user_name is not None and msg.user_name != user_name:
+                continue
+            if channel_id is not None and msg.channel_id != channel_id:
+                continue
+            if not self._matches_terms(msg, terms, prefix):
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            matches.append(msg.to_dict())
+            if limit is not None and len(matches) >= limit:
+                break
         
-        return {
-            "user_name": user_name,
-            "total_messages": len(user_messages),
-            "first_message": user_messages[0]["date"],
-            "last_message": user_messages[-1]["date"]
-        }
+        return matches
+    
+    def get_user_stats(self, user_name: str) -> Dict:
+        stats = self._user_stats.get(user_name) or MessageAggregate()
+        return {"user_name": user_name, **stats.to_dict()}
+    
+    def get_channel_stats(self, channel_id: str) -> Dict:
+        stats = self._channel_stats.get(channel_id) or MessageAggregate()
+        return {"channel_id": channel_id, **stats.to_dict()}
+    
+    def get_all_user_stats(self) -> List[Dict]:
+        return [{"user_name": name, **stats.to_dict()} for name, stats in self._user_stats.items()]
+    
+    def get_all_channel_stats(self) -> List[Dict]:
+        return [{"channel_id": channel_id, **stats.to_dict()} for channel_id, stats in self._channel_stats.items()]
     
     def clear_memory(self):
-        self.memory_data = {
-            "messages": [],
-            "metadata": {
-                "created_at": datetime.now().isoformat(),
-                "version": "1.0",
-                "total_messages": 0
-            }
-        }
-        self._save_memory()
+        self.memory_data = self._empty_memory()
+        self._reset_indexes()
+        try:
+            self.journal.append("clear")
+        except Exception as e:
+            print(f"Error saving memory to {self.journal.journal_file}: {e}")
+        self.compact(wait=True)
     
     def get_memory_size(self) -> int:
         return len(self.memory_data["messages"])
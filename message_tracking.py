@@ -0,0 +1,117 @@
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+
+
+class ChannelActivity:
+    __slots__ = ("sequence", "others_seen", "recent", "marks", "last_active")
+
+    def __init__(self, max_tracked: int):
+        self.last_active = time.time()
+        self.sequence = 0
+        self.others_seen = 0
+        self.recent: deque = deque(maxlen=max_tracked)
+        self.marks: Dict[str, Tuple[int, int]] = {}
+
+
+class ChannelActivityTracker:
+
+    def __init__(self, max_tracked: int = 200, max_channels: int = 500, idle_timeout: float = 3600):
+        self.max_tracked = max_tracked
+        self.max_channels = max_channels
+        self.idle_timeout = idle_timeout
+        self.channels: "OrderedDict[str, ChannelActivity]" = OrderedDict()
+        self.local_answers = 0
+        self.fallbacks = 0
+        self.evicted_channels = 0
+
+    def _evict(self, now: float):
+        cutoff = now - self.idle_timeout
+        while self.channels:
+            channel_id, activity = next(iter(self.channels.items()))
+            if len(self.channels) <= self.max_channels and activity.last_active >= cutoff:
+                break
+            del self.channels[channel_id]
+            self.evicted_channels += 1
+
+    def record(self, channel_id: str, message_id: str, author_id: str, is_self: bool):
+        now = time.time()
+        activity = self.channels.get(channel_id)
+        if activity is None:
+            activity = self.channels[channel_id] = ChannelActivity(self.max_tracked)
+        else:
+            self.channels.move_to_end(channel_id)
+        activity.last_active = now
+
+        if len(activity.recent) == activity.recent.maxlen:
+            evicted_id, _ = activity.recent[0]
+            activity.marks.pop(evicted_id, None)
+
+        activity.sequence += 1
+        if not is_self:
+            activity.others_seen += 1
+        activity.recent.append((message_id, author_id))
+        activity.marks[message_id] = (activity.sequence, activity.others_seen)
+
+        self._evict(now)
+
+    def count_since(self, channel_id: str, message_id: str) -> Optional[int]:
+        activity = self.channels.get(channel_id)
+        mark = activity.marks.get(message_id) if activity is not None else None
+        if mark is None:
+            self.fallbacks += 1
+            return None
+
+        self.local_answers += 1
+        return activity.others_seen - mark[1]
+
+    def stats(self) -> Dict:
+        lookups = self.local_answers + self.fallbacks
+        return {
+            "channels": len(self.channels),
+            "evicted_channels": self.evicted_channels,
+            "local_answers": self.local_answers,
+            "rest_fallbacks": self.fallbacks,
+            "local_rate": self.local_answers / lookups if lookups else 0.0
+        }
+
+
+class OwnMessageCache:
+
+    def __init__(self, max_ids: int = 2000, since_id: int = 0):
+        self._ids = set()
+        self._order: deque = deque()
+        self.max_ids = max_ids
+        self.floor_id = since_id
+        self.hits = {"resolved": 0, "own_cache": 0, "client_cache": 0, "known_absent": 0, "rest": 0}
+
+    def add(self, message_id: int):
+        message_id = int(message_id)
+        if message_id in self._ids:
+            return
+
+        self._ids.add(message_id)
+        self._order.append(message_id)
+        while len(self._order) > self.max_ids:
+            evicted = self._order.popleft()
+            self._ids.discard(evicted)
+            self.floor_id = max(self.floor_id, evicted)
+
+    def lookup(self, message_id: int) -> Optional[bool]:
+        message_id = int(message_id)
+        if message_id in self._ids:
+            return True
+        if message_id > self.floor_id:
+            return False
+        return None
+
+    def record(self, source: str):
+        self.hits[source] += 1
+
+    def stats(self) -> Dict:
+        lookups = sum(self.hits.values())
+        return {
+            "tracked_ids": len(self._ids),
+            **self.hits,
+            "local_rate": (lookups - self.hits["rest"]) / lookups if lookups else 0.0
+        }
@@ -0,0 +1,136 @@
+import random
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class ModelInfo:
+
+    def __init__(self, name: str, capabilities: Iterable[str], context_window: int = 0,
+                 prompt_budget: Optional[int] = None):
+        self.name = name
+        self.capabilities: Set[str] = set(capabilities)
+        self.context_window = context_window
+        self.prompt_budget = prompt_budget
+
+    def supports(self, capability: str) -> bool:
+        return capability in self.capabilities
+
+
+class ModelStats:
+    __slots__ = ("ewma_latency", "error_rate", "last_failure", "last_success",
+                 "consecutive_failures", "open_until", "requests", "failures")
+
+    def __init__(self):
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.last_failure: Optional[float] = None
+        self.last_success: Optional[float] = None
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+
+class ModelRegistry:
+
+    def __init__(self, models: Iterable[ModelInfo], ewma_alpha: float = 0.3,
+                 failure_threshold: int = 3, cooldown: float = 60, max_cooldown: float = 900,
+                 explore_chance: float = 0.1, prior_latency: float = 2.0, failure_penalty: float = 30.0):
+        self.models: Dict[str, ModelInfo] = {model.name: model for model in models}
+        self.stats: Dict[str, ModelStats] = {name: ModelStats() for name in self.models}
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.explore_chance = explore_chance
+        self.prior_latency = prior_latency
+        self.failure_penalty = failure_penalty
+
+    def get(self, name: str) -> Optional[ModelInfo]:
+        return self.models.get(name)
+
+    def models_with(self, capability: str) -> List[str]:
+        return [name for name, info in self.models.items() if info.supports(capability)]
+
+    def _stats_for(self, name: str) -> ModelStats:
+        if name not in self.stats:
+            self.stats[name] = ModelStats()
+        return self.stats[name]
+
+    def record_success(self, name: str, latency: float):
+        stats = self._stats_for(name)
+        stats.requests += 1
+        stats.last_success = time.time()
+        stats.consecutive_failures = 0
+        stats.open_until = 0.0
+        stats.error_rate *= (1 - self.ewma_alpha)
+
+        if stats.ewma_latency is None:
+            stats.ewma_latency = latency
+        else:
+            stats.ewma_latency += self.ewma_alpha * (latency - stats.ewma_latency)
+
+    def record_failure(self, name: str, latency: Optional[float] = None):
+        stats = self._stats_for(name)
+        now = time.time()
+        stats.requests += 1
+        stats.failures += 1
+        stats.last_failure = now
+        stats.consecutive_failures += 1
+        stats.error_rate += self.ewma_alpha * (1 - stats.error_rate)
+
+        if stats.ewma_latency is None:
+            stats.ewma_latency = max(latency or 0.0, self.failure_penalty)
+        elif latency is not None:
+            stats.ewma_latency += self.ewma_alpha * (max(latency, stats.ewma_latency) - stats.ewma_latency)
+
+        if stats.consecutive_failures >= self.failure_threshold:
+            excess = stats.consecutive_failures - self.failure_threshold
+            cooldown = min(self.max_cooldown, self.cooldown * (2 ** excess))
+            stats.open_until = now + cooldown
+            print(f"Circuit open for {name} for {cooldown:.0f}s after {stats.consecutive_failures} failures")
+
+    def is_healthy(self, name: str) -> bool:
+        return self._stats_for(name).open_until <= time.time()
+
+    def _score(self, name: str) -> float:
+        stats = self._stats_for(name)
+        latency = self.prior_latency if stats.ewma_latency is None else stats.ewma_latency
+        return latency * (1 + 4 * stats.error_rate)
+
+    def ranked_models(self, capability: str = "chat") -> List[str]:
+        candidates = self.models_with(capability)
+        healthy = [name for name in candidates if self.is_healthy(name)]
+
+        if not healthy:
+            return sorted(candidates, key=lambda name: self._stats_for(name).open_until)
+
+        healthy.sort(key=self._score)
+
+        if len(healthy) > 1 and random.random() < self.explore_chance:
+            index = random.randint(1, len(healthy) - 1)
+            healthy[0], healthy[index] = healthy[index], healthy[0]
+
+        return healthy
+
+    def best_model(self, capability: str = "chat") -> Optional[str]:
+        ranked = self.ranked_models(capability)
+        return ranked[0] if ranked else None
+
+    def get_scoreboard(self) -> List[Dict]:
+        scoreboard = []
+        for name, info in self.models.items():
+            stats = self._stats_for(name)
+            scoreboard.append({
+                "model": name,
+                "capabilities": sorted(info.capabilities),
+                "context_window": info.context_window,
+                "prompt_budget": info.prompt_budget,
+                "ewma_latency": stats.ewma_latency,
+                "error_rate": stats.error_rate,
+                "last_failure": stats.last_failure,
+                "healthy": self.is_healthy(name),
+                "requests": stats.requests,
+                "failures": stats.failures
+            })
+        return scoreboard
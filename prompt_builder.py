@@ -0,0 +1,140 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    if not text:
+        return 0
+    return math.ceil(len(text) / chars_per_token)
+
+
+class PromptSection:
+
+    def __init__(self, name: str, text: str, priority: int = 0, trim_head: int = 0,
+                 trim_tail: int = 0, trimmable: bool = False):
+        self.name = name
+        self.text = text
+        self.priority = priority
+        self.trim_head = trim_head
+        self.trim_tail = trim_tail
+        self.trimmable = trimmable
+
+    @property
+    def required(self) -> bool:
+        return self.priority == 0
+
+
+class PromptAssembler:
+
+    def __init__(self, default_budget: int = 4096, message_overhead: int = 4,
+                 chars_per_token: float = 4.0, section_separator: str = "\n\n"):
+        self.default_budget = default_budget
+        self.message_overhead = message_overhead
+        self.chars_per_token = chars_per_token
+        self.section_separator = section_separator
+        self.usage_stats: Dict[str, Dict] = {}
+
+    def estimate(self, text: str) -> int:
+        return estimate_tokens(text, self.chars_per_token)
+
+    def _trim_section(self, section: PromptSection, available: int) -> Optional[str]:
+        lines = section.text.split("\n")
+        head = lines[:section.trim_head]
+        tail = lines[len(lines) - section.trim_tail:] if section.trim_tail else []
+        body = lines[section.trim_head:len(lines) - section.trim_tail]
+
+        kept = []
+        used = self.estimate("\n".join(head + tail))
+        for line in reversed(body):
+            cost = self.estimate(line) + 1
+            if used + cost > available:
+                break
+            kept.append(line)
+            used += cost
+
+        if not kept:
+            return None
+
+        kept.reverse()
+        return "\n".join(head + kept + tail)
+
+    def build(self, sections: List[PromptSection], history: List[Any], user_message: str,
+              budget: Optional[int] = None, history_priority: int = 2) -> Tuple[List[Dict], int]:
+        budget = budget or self.default_budget
+        separator_cost = self.estimate(self.section_separator)
+
+        used = self.message_overhead * 2 + self.estimate(user_message)
+        included: Dict[str, str] = {}
+        for section in sections:
+            if section.required:
+                included[section.name] = section.text
+                used += self.estimate(section.text) + separator_cost
+
+        optional = sorted(
+            [section for section in sections if not section.required and section.text]
+            + [PromptSection("history", "", priority=history_priority)],
+            key=lambda section: section.priority
+        )
+
+        kept_history: List[Any] = []
+        for section in optional:
+            available = budget - used
+
+            if section.name == "history":
+                for msg in reversed(history):
+                    cost = self.estimate(msg.content) + self.message_overhead
+                    if cost > available:
+                        break
+                    kept_history.append(msg)
+                    available -= cost
+                    used += cost
+                kept_history.reverse()
+                continue
+
+            cost = self.estimate(section.text) + separator_cost
+            if cost <= available:
+                included[section.name] = section.text
+                used += cost
+            elif section.trimmable:
+                trimmed = self._trim_section(section, available - separator_cost)
+                if trimmed is not None:
+                    included[section.name] = trimmed
+                    used += self.estimate(trimmed) + separator_cost
+
+        system_prompt = self.section_separator.join(
+            included[section.name] for section in sections if section.name in included
+        )
+
+        messages = [{"role": "system", "content": system_prompt}]
+        for msg in kept_history:
+            messages.append({"role": msg.role, "content": msg.content})
+        messages.append({"role": "user", "content": user_message})
+
+        estimated = sum(self.estimate(msg["content"]) + self.message_overhead for msg in messages)
+        return messages, estimated
+
+    def record_usage(self, model: str, estimated: int, actual: Optional[int],
+                     cached: Optional[int] = None):
+        stats = self.usage_stats.setdefault(model, {
+            "requests": 0,
+            "estimated_tokens": 0,
+            "actual_tokens": 0,
+            "cached_tokens": 0,
+            "unknown_actual": 0,
+            "last_estimated": None,
+            "last_actual": None
+        })
+        stats["requests"] += 1
+        stats["estimated_tokens"] += estimated
+        stats["last_estimated"] = estimated
+
+        if cached:
+            stats["cached_tokens"] += cached
+
+        if actual is not None:
+            stats["actual_tokens"] += actual
+            stats["last_actual"] = actual
+            print(f"Prompt tokens for {model}: estimated {estimated}, actual {actual}, cached {cached or 0}")
+        else:
+            stats["unknown_actual"] += 1
+            print(f"Prompt tokens for {model}: estimated {estimated}, actual unknown")
@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_message(text: str) -> str:
+    return WHITESPACE_PATTERN.sub(" ", text.lower()).strip()
+
+
+class ResponseCache:
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300, persist_file: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist_file = persist_file
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+
+        if persist_file:
+            self.load()
+
+    @staticmethod
+    def make_key(message: str, personality: str = "", history: Optional[List[Any]] = None,
+                 *extra: Any) -> str:
+        digest = hashlib.sha1()
+        digest.update(normalize_message(message).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(personality.encode("utf-8"))
+        for msg in history or []:
+            digest.update(b"\0")
+            digest.update(f"{msg.role}:{normalize_message(msg.content)}".encode("utf-8"))
+        for value in extra:
+            digest.update(b"\0")
+            digest.update(str(value).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any):
+        self._entries[key] = (time.time() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Optional[Any]:
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.collapsed += 1
+            return await asyncio.shield(in_flight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        value = None
+        try:
+            value = await factory()
+            if value is not None:
+                self.set(key, value)
+            return value
+        finally:
+            del self._in_flight[key]
+            future.set_result(value)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.collapsed
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "collapsed": self.collapsed,
+            "saved_calls": self.hits + self.collapsed,
+            "hit_rate": (self.hits + self.collapsed) / lookups if lookups else 0.0
+        }
+
+    def load(self):
+        if not self.persist_file or not os.path.exists(self.persist_file):
+            return
+
+        try:
+            with open(self.persist_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Error loading response cache: {e}")
+            return
+
+        now = time.time()
+        for key, (expires_at, value) in data.get("entries", {}).items():
+            if expires_at >= now:
+                self._entries[key] = (expires_at, tuple(value) if isinstance(value, list) else value)
+
+    def save(self):
+        if not self.persist_file:
+            return
+
+        now = time.time()
+        data = {
+            "entries": {key: entry for key, entry in self._entries.items() if entry[0] >= now}
+        }
+        tmp_file = f"{self.persist_file}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.persist_file)
+        except OSError as e:
+            print(f"Error saving response cache: {e}")
@@ -1,50 +1,133 @@
 import discord
-import requests
 import json
 import asyncio
 import random
 import os
 import time
 import re
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from discord.ext import commands, tasks
+from discord.ext import commands
 from message_memory import MessageMemory
+from sqlite_memory import SQLiteMessageMemory
+from llm_client import LLMClient
+from model_registry import ModelInfo, ModelRegistry
+from prompt_builder import PromptAssembler, PromptSection
+from response_cache import ResponseCache
+from burst_coalescer import BurstCoalescer
+from llm_scheduler import LLMScheduler, RateLimitGovernor
+from message_tracking import ChannelActivityTracker, OwnMessageCache
+from trigger_matcher import TriggerMatcher
+from command_router import CommandRouter
+from state_store import StateStore
+from conversation_history import ConversationHistory
+from job_scheduler import JobScheduler
 
 load_dotenv()
 
 class DiscordSelfBot:
     def __init__(self):
         self.token = os.getenv("TOKEN")
+        self.state_store = StateStore(debounce=1.0)
         self.groq_api_key = os.getenv("GROQ_API_KEY")
 
-        self.available_models = [
-            "meta-llama/llama-4-scout-17b-16e-instruct",
-            "meta-llama/llama-4-maverick-17b-128e-instruct",
-            "llama-3.1-8b-instant",
-            "groq/compound",
-            "openai/gpt-oss-120b",
-            "whisper-large-v3",
-            "whisper-large-v3-turbo"
-        ]
+        self.model_registry = ModelRegistry([
+            ModelInfo("meta-llama/llama-4-scout-17b-16e-instruct", {"chat"}, context_window=131072, prompt_budget=6000),
+            ModelInfo("meta-llama/llama-4-maverick-17b-128e-instruct", {"chat"}, context_window=131072, prompt_budget=6000),
+            ModelInfo("llama-3.1-8b-instant", {"chat"}, context_window=131072, prompt_budget=3000),
+            ModelInfo("groq/compound", {"chat"}, context_window=131072, prompt_budget=6000),
+            ModelInfo("openai/gpt-oss-120b", {"chat"}, context_window=131072, prompt_budget=6000),
+            ModelInfo("whisper-large-v3", {"transcription"}),
+            ModelInfo("whisper-large-v3-turbo", {"transcription"})
+        ])
+
+        self.llm_pool_size = 10
+        self.llm_request_timeout = 30
+        self.llm_max_concurrency = 4
+        self.rate_limit_max_wait = 10.0
+        self.rate_limit_governor = RateLimitGovernor(max_wait=self.rate_limit_max_wait)
+        self.llm_scheduler = LLMScheduler(max_concurrency=self.llm_max_concurrency)
+        self.llm_client = LLMClient(
+            api_key=self.groq_api_key,
+            pool_size=self.llm_pool_size,
+            timeout=self.llm_request_timeout,
+            registry=self.model_registry,
+            governor=self.rate_limit_governor
+        )
+
+        self.prompt_assembler = PromptAssembler(default_budget=4096)
+        self.compile_prompt_templates()
+
+        self.response_cache_history_depth = 2
+        self.response_cache = ResponseCache(
+            max_entries=256,
+            ttl=120,
+            persist_file=None
+        )
+
+        self.burst_max_window = 12.0
+        self.burst_max_size = 5
+        self.burst_coalescer = BurstCoalescer(
+            max_window=self.burst_max_window,
+            max_size=self.burst_max_size
+        )
+
+        self.stream_responses = True
+        self.stream_max_sentences = 3
+        self.stream_max_chars = 400
+
+        self.hedge_requests = True
+        self.hedge_percentile = 0.9
+        self.hedge_default_delay = 4.0
+        self.max_hedged_requests = 2
 
         self.bot = commands.Bot(command_prefix='!', self_bot=True)
 
-        self.conversation_history = {}
         self.max_history_length = 25
+        self.max_history_channels = 500
+        self.max_history_entries = 5000
+        self.history_idle_timeout = 86400
+        self.conversation_history = ConversationHistory(
+            max_per_channel=self.max_history_length,
+            max_channels=self.max_history_channels,
+            max_entries=self.max_history_entries,
+            idle_timeout=self.history_idle_timeout
+        )
 
         self.trigger_words = [
             "eyesore", "sinmoneyz", "poopey peepy"
         ]
+        self.trigger_mode = "substring"
+        self.max_trigger_repeats = 2
+        self.trigger_matcher = TriggerMatcher(self.trigger_words, mode=self.trigger_mode)
+
+        self.activity_triggers = [
+            "wyd", "wsp", "what's up", "whats up", "what are you doing",
+            "whatcha doing", "what u doing", "what are u doing", "sup",
+            "what you up to", "what are you up to", "hbu", "how about you",
+            "what period", "what class", "which period", "which class"
+        ]
+        self.activity_matcher = TriggerMatcher(self.activity_triggers, mode="word")
 
         self.excluded_server_ids = [
             "1072012646162911272"
         ]
 
-        self.message_memory = MessageMemory(
-            memory_file="message_memory.json",
-            max_memory_items=1000
-        )
+        self.memory_backend = "journal"
+        if self.memory_backend == "sqlite":
+            self.message_memory = SQLiteMessageMemory(
+                db_file="message_memory.db",
+                retention_days=90
+            )
+        else:
+            self.message_memory = MessageMemory(
+                memory_file="message_memory.json",
+                max_memory_items=1000,
+                fsync_policy="interval",
+                compact_every=500
+            )
+
+        self.memory_retrieval_mode = "relevance"
 
         self.nicknames = self.load_nicknames()
         self.personalities = self.load_personalities()
@@ -116,6 +199,15 @@ class DiscordSelfBot:
         self.last_typo_message_id = None
 
         self.last_response_time = {}
+        self.activity_tracker = ChannelActivityTracker(
+            max_tracked=200,
+            max_channels=500,
+            idle_timeout=3600
+        )
+        self.own_messages = OwnMessageCache(
+            max_ids=2000,
+            since_id=discord.utils.time_snowflake(datetime.now(timezone.utc))
+        )
         self.passive_response_chance = 0.03
         self.active_convo_window = 600
 
@@ -139,15 +231,16 @@ class DiscordSelfBot:
 
         self.conversation_channels = set()
 
+        self.stats_log_interval = 3600
+
+        self.register_commands()
+        self.register_jobs()
+
     async def load_custom_statuses(self):
         try:
-            if os.path.exists("custom_statuses.json"):
-                with open("custom_statuses.json", 'r') as f:
-                    data = json.load(f)
-                    self.custom_statuses = data.get('statuses', [])
-                    if not self.custom_statuses:
-                        await self.generate_ai_statuses()
-            else:
+            data = self.state_store.load("custom_statuses.json")
+            self.custom_statuses = data.get('statuses', [])
+            if not self.custom_statuses:
                 await self.generate_ai_statuses()
         except Exception as e:
             print(f"Error loading custom statuses: {e}")
@@ -160,11 +253,6 @@ class DiscordSelfBot:
     async def generate_ai_statuses(self):
         print("Generating AI custom statuses...")
 
-        headers = {
-            "Authorization": f"Bearer {self.groq_api_key}",
-            "Content-Type": "application/json"
-        }
-
         prompt = """Generate 20 unique Discord status messages for a sarcastic teenage bot named eyesore.
         Requirements:
         - Maximum 128 characters each
@@ -188,16 +276,9 @@ class DiscordSelfBot:
                 "max_tokens": 500
             }
 
-            response = await asyncio.to_thread(
-                requests.post,
-                url="https://api.groq.com/openai/v1/chat/completions",
-                headers=headers,
-                data=json.dumps(data),
-                timeout=30
-            )
+            status, result, _ = await self.llm_client.chat_completion(data, timeout=self.llm_request_timeout)
 
-            if response.status_code == 200:
-                result = response.json()
+            if status == 200 and result:
                 if 'choices' in result and len(result['choices']) > 0:
                     content = result['choices'][0]['message']['content'].strip()
                     if '[' in content and ']' in content:
@@ -251,11 +332,10 @@ class DiscordSelfBot:
     def save_custom_statuses(self):
         try:
             data = {
-                'statuses': self.custom_statuses,
+                'statuses': list(self.custom_statuses),
                 'last_generated': datetime.now().isoformat()
             }
-            with open("custom_statuses.json", 'w') as f:
-                json.dump(data, f, indent=2)
+            self.state_store.write("custom_statuses.json", data)
         except Exception as e:
             print(f"Error saving custom statuses: {e}")
 
@@ -282,11 +362,9 @@ class DiscordSelfBot:
 
     def load_bot_settings(self):
         try:
-            if os.path.exists(self.settings_file):
-                with open(self.settings_file, 'r') as f:
-                    settings = json.load(f)
-                    self.stealth_mode = settings.get('stealth_mode', True)
-                    self.role_ping_targets = settings.get('role_ping_targets', {})
+            settings = self.state_store.load(self.settings_file)
+            self.stealth_mode = settings.get('stealth_mode', True)
+            self.role_ping_targets = settings.get('role_ping_targets', {})
         except Exception as e:
             print(f"Error loading bot settings: {e}")
 
@@ -294,20 +372,16 @@ class DiscordSelfBot:
         try:
             settings = {
                 'stealth_mode': self.stealth_mode,
-                'role_ping_targets': self.role_ping_targets
+                'role_ping_targets': dict(self.role_ping_targets)
             }
-            with open(self.settings_file, 'w') as f:
-                json.dump(settings, f, indent=2)
+            self.state_store.write(self.settings_file, settings)
         except Exception as e:
             print(f"Error saving bot settings: {e}")
 
     def load_whitelist(self):
         try:
-            if os.path.exists("whitelist.json"):
-                with open("whitelist.json", 'r') as f:
-                    data = json.load(f)
-                    return set(data.get('whitelisted_users', []))
-            return set()
+            data = self.state_store.load("whitelist.json")
+            return set(data.get('whitelisted_users', []))
         except Exception as e:
             print(f"Error loading whitelist: {e}")
             return set()
@@ -317,18 +391,14 @@ class DiscordSelfBot:
             data = {
                 'whitelisted_users': list(self.whitelisted_users)
             }
-            with open("whitelist.json", 'w') as f:
-                json.dump(data, f, indent=2)
+            self.state_store.write("whitelist.json", data)
         except Exception as e:
             print(f"Error saving whitelist: {e}")
 
     def load_allowed_channels(self):
         try:
-            if os.path.exists("allowed_channels.json"):
-                with open("allowed_channels.json", 'r') as f:
-                    data = json.load(f)
-                    return set(data.get('allowed_channels', []))
-            return set()
+            data = self.state_store.load("allowed_channels.json")
+            return set(data.get('allowed_channels', []))
         except Exception as e:
             print(f"Error loading allowed channels: {e}")
             return set()
@@ -338,18 +408,14 @@ class DiscordSelfBot:
             data = {
                 'allowed_channels': list(self.allowed_channels)
             }
-            with open("allowed_channels.json", 'w') as f:
-                json.dump(data, f, indent=2)
+            self.state_store.write("allowed_channels.json", data)
         except Exception as e:
             print(f"Error saving allowed channels: {e}")
 
     def load_nicknames(self):
         try:
-            if os.path.exists("nicknames.json"):
-                with open("nicknames.json", 'r') as f:
-                    data = json.load(f)
-                    return data.get('nicknames', {})
-            return {}
+            data = self.state_store.load("nicknames.json")
+            return data.get('nicknames', {})
         except Exception as e:
             print(f"Error loading nicknames: {e}")
             return {}
@@ -357,20 +423,16 @@ class DiscordSelfBot:
     def save_nicknames(self):
         try:
             data = {
-                'nicknames': self.nicknames
+                'nicknames': dict(self.nicknames)
             }
-            with open("nicknames.json", 'w') as f:
-                json.dump(data, f, indent=2)
+            self.state_store.write("nicknames.json", data)
         except Exception as e:
             print(f"Error saving nicknames: {e}")
 
     def load_personalities(self):
         try:
-            if os.path.exists("personalities.json"):
-                with open("personalities.json", 'r') as f:
-                    data = json.load(f)
-                    return data.get('personalities', {})
-            return {}
+            data = self.state_store.load("personalities.json")
+            return data.get('personalities', {})
         except Exception as e:
             print(f"Error loading personalities: {e}")
             return {}
@@ -378,10 +440,9 @@ class DiscordSelfBot:
     def save_personalities(self):
         try:
             data = {
-                'personalities': self.personalities
+                'personalities': dict(self.personalities)
             }
-            with open("personalities.json", 'w') as f:
-                json.dump(data, f, indent=2)
+            self.state_store.write("personalities.json", data)
         except Exception as e:
             print(f"Error saving personalities: {e}")
 
@@ -481,7 +542,7 @@ class DiscordSelfBot:
         return False
 
     def get_random_model(self):
-        return random.choice(self.available_models)
+        return self.model_registry.best_model("chat")
 
     def get_est_hour(self):
         est_offset = -5
@@ -579,16 +640,7 @@ class DiscordSelfBot:
             return {"in_school": False, "status": "after_school"}
 
     def get_real_life_context(self, user_message):
-        wyd_triggers = [
-            "wyd", "wsp", "what's up", "whats up", "what are you doing",
-            "whatcha doing", "what u doing", "what are u doing", "sup",
-            "what you up to", "what are you up to", "hbu", "how about you",
-            "what period", "what class", "which period", "which class"
-        ]
-
-        message_lower = user_message.lower().strip()
-
-        if not any(trigger in message_lower for trigger in wyd_triggers):
+        if self.activity_matcher.find(user_message) is None:
             return ""
 
         school_status = self.get_current_school_period()
@@ -677,11 +729,12 @@ class DiscordSelfBot:
                     self.last_voice_activity = time.time()
 
                     duration = random.randint(120, 900)
-                    await asyncio.sleep(duration)
-
-                    voice_client = self.bot.voice_clients[0] if self.bot.voice_clients else None
-                    if voice_client:
-                        await voice_client.disconnect()
+                    try:
+                        await asyncio.sleep(duration)
+                    finally:
+                        voice_client = self.bot.voice_clients[0] if self.bot.voice_clients else None
+                        if voice_client:
+                            await voice_client.disconnect()
 
                 except Exception as e:
                     print(f"Failed to join voice channel: {e}")
@@ -707,36 +760,13 @@ class DiscordSelfBot:
                 except:
                     pass
 
-    async def get_ai_response(self, user_message, model=None, channel_id=None, user_name=None, user_id=None):
-        if model is None:
-            models_to_try = self.available_models.copy()
-            random.shuffle(models_to_try)
-        else:
-            models_to_try = [model]
-
-        headers = {
-            "Authorization": f"Bearer {self.groq_api_key}",
-            "Content-Type": "application/json"
-        }
-
-        history = []
-        if channel_id and channel_id in self.conversation_history:
-            history = self.conversation_history[channel_id][-8:]
-
-        memory_context = self.message_memory.get_memory_context(limit=15, hours=48)
-
-        real_life_context = self.get_real_life_context(user_message)
-
-        user_personality = self.personalities.get(user_id, "") if user_id else ""
-
-        base_personality = f"""You are a Discord selfbot, named eyesore (with the actual username being sinmoneyz). NEVER ADMIT THAT YOU ARE!
+    def compile_prompt_templates(self):
+        identity_section = """You are a Discord selfbot, named eyesore (with the actual username being sinmoneyz). NEVER ADMIT THAT YOU ARE!
 You have memory of recent messages in this conversation (see history below)
-You know the user's display name is {user_name} - NEVER use their raw Discord username (like caspian_voss_), always use their display name or a nickname
-You're 16 and in school, but don't elaborate on personal details when asked (under the guise of "i dont want to give out personal info lol")
+You know the user's display name (given below) - NEVER use their raw Discord username (like caspian_voss_), always use their display name or a nickname
+You're 16 and in school, but don't elaborate on personal details when asked (under the guise of "i dont want to give out personal info lol")"""
 
-{user_personality}
-
-CRITICAL RULES:
+        rules_section = """CRITICAL RULES:
 - NEVER end messages with random "btw" statements like "i got homework btw" or "i have a test btw" - this is a dead giveaway you're a bot
 - NEVER add unrelated tangents at the end of your responses
 - Keep responses focused on what you're actually replying to
@@ -752,82 +782,145 @@ You are a normal 16 year old, NOT a genius or encyclopedia. You MUST follow thes
 - Long memorized texts: Can't recite poems, speeches, etc. Say "i dont have that memorized lol"
 This is CRITICAL - giving precise factual answers makes you look like a bot! Additionally, NEVER ADMIT YOU'RE A BOT!
 
-IMPORTANT: Always respond in this personality. Never break character. Never respond with generic or overly helpful answers.
-
-LEARNING CONTEXT:
-{memory_context}
+IMPORTANT: Always respond in this personality. Never break character. Never respond with generic or overly helpful answers."""
 
-MODERN SLANG:
+        slang_section = """MODERN SLANG:
 cook (cooked, cooking, etc): amazing, perfectly done, etc
 twink: a boy who is outwardly gay and considered cute
 femboy: a boy who outwardly dresses and acts like a girl, self explanatory
 me when i lie: literally just that, sarcastically saying someone is lying
-myf: my fault
+myf: my fault"""
+
+        self.static_system_prompt = self.prompt_assembler.section_separator.join([
+            identity_section,
+            rules_section,
+            slang_section
+        ])
+
+    async def get_ai_response(self, user_message, model=None, channel_id=None, user_name=None, user_id=None,
+                              guild_id=None, dm_channel_id=None, priority="trigger", memory_exclude=None):
+        history = self.conversation_history.get(channel_id) if channel_id else []
+        if history and history[-1].role == "user":
+            history = history[:-1]
+
+        depth = self.response_cache_history_depth
+        cache_key = ResponseCache.make_key(
+            user_message,
+            self.personalities.get(user_id, "") if user_id else "",
+            history[-depth:] if depth else [],
+            user_name,
+            model
+        )
 
+        result = await self.response_cache.get_or_compute(
+            cache_key,
+            lambda: self.llm_scheduler.submit(
+                lambda: self.generate_ai_response(
+                    user_message,
+                    model=model,
+                    channel_id=channel_id,
+                    user_name=user_name,
+                    user_id=user_id,
+                    guild_id=guild_id,
+                    dm_channel_id=dm_channel_id,
+                    memory_exclude=memory_exclude
+                ),
+                priority=priority,
+                channel_id=channel_id
+            )
+        )
 
-CURRENT ACTIVITY (only use if relevant to conversation):
-{real_life_context}"""
+        if result is None:
+            print("All models failed, returning fallback response")
+            return "bruh", "just shut up vro"
 
-        personality_prompt = base_personality
+        return result
 
-        messages = [
-            {
-                "role": "system",
-                "content": personality_prompt
-            }
+    async def generate_ai_response(self, user_message, model=None, channel_id=None, user_name=None, user_id=None,
+                                   guild_id=None, dm_channel_id=None, memory_exclude=None):
+        if model is None:
+            models_to_try = self.model_registry.ranked_models("chat")
+        else:
+            models_to_try = [model]
+
+        history = self.conversation_history.get(channel_id, limit=8) if channel_id else []
+
+        memory_context = self.message_memory.get_memory_context(
+            limit=15,
+            hours=48,
+            channel_id=channel_id,
+            guild_id=guild_id,
+            dm_channel_id=dm_channel_id,
+            query=user_message if self.memory_retrieval_mode == "relevance" else None,
+            exclude=memory_exclude
+        )
+
+        real_life_context = self.get_real_life_context(user_message)
+
+        user_personality = self.personalities.get(user_id, "") if user_id else ""
+
+        user_section = f"""The user's display name is {user_name}"""
+
+        sections = [
+            PromptSection("static", self.static_system_prompt),
+            PromptSection("user", user_section),
+            PromptSection("user_personality", user_personality, priority=1),
+            PromptSection(
+                "memory",
+                f"LEARNING CONTEXT:\n{memory_context}" if memory_context else "",
+                priority=3,
+                trimmable=True,
+                trim_head=3,
+                trim_tail=2
+            ),
+            PromptSection(
+                "activity",
+                f"CURRENT ACTIVITY (only use if relevant to conversation):\n{real_life_context}" if real_life_context else "",
+                priority=1
+            ),
         ]
 
-        for msg in history:
-            messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
+        built_prompts = {}
 
-        messages.append({
-            "role": "user",
-            "content": user_message
-        })
+        def build_prompt(current_model):
+            info = self.model_registry.get(current_model)
+            budget = info.prompt_budget if info else None
+            if budget not in built_prompts:
+                built_prompts[budget] = self.prompt_assembler.build(sections, history, user_message, budget=budget)
+            return built_prompts[budget]
 
-        data_template = {
-            "messages": messages
-        }
+        def build_payload(current_model):
+            messages, _ = build_prompt(current_model)
+            return {"messages": messages}
 
-        for current_model in models_to_try:
-            data = data_template.copy()
-            data["model"] = current_model
+        hedge_delay = self.llm_client.get_hedge_delay(
+            percentile=self.hedge_percentile,
+            default=self.hedge_default_delay
+        )
+        ai_response, model_used, usage = await self.llm_client.hedged_chat_completion(
+            build_payload,
+            models_to_try,
+            max_in_flight=self.max_hedged_requests if self.hedge_requests else 1,
+            hedge_delay=hedge_delay,
+            timeout=self.llm_request_timeout,
+            stream={
+                "max_sentences": self.stream_max_sentences,
+                "max_chars": self.stream_max_chars
+            } if self.stream_responses else None
+        )
 
-            try:
-                response = requests.post(
-                    url="https://api.groq.com/openai/v1/chat/completions",
-                    headers=headers,
-                    data=json.dumps(data),
-                    timeout=30
-                )
-
-                if response.status_code == 200:
-                    result = response.json()
-                    if 'choices' in result and len(result['choices']) > 0:
-                        ai_response = result['choices'][0]['message']['content']
-                        return ai_response, current_model
-                    else:
-                        print(f"Model {current_model} returned empty response, trying next model...")
-                        continue
-                else:
-                    print(f"Model {current_model} failed with status {response.status_code}, trying next model...")
-                    continue
-
-            except requests.exceptions.RequestException as e:
-                print(f"Model {current_model} request failed: {str(e)}, trying next model...")
-                continue
-            except json.JSONDecodeError:
-                print(f"Model {current_model} returned invalid JSON, trying next model...")
-                continue
-            except Exception as e:
-                print(f"Model {current_model} unexpected error: {str(e)}, trying next model...")
-                continue
+        if ai_response is not None:
+            _, estimated_tokens = build_prompt(model_used)
+            usage = usage or {}
+            self.prompt_assembler.record_usage(
+                model_used,
+                estimated_tokens,
+                usage.get("prompt_tokens"),
+                (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+            )
+            return ai_response, model_used
 
-        print("All models failed, returning fallback response")
-        return "bruh", "just shut up vro"
+        return None
 
     def was_mentioned(self, message):
         if not message.mentions:
@@ -850,28 +943,42 @@ CURRENT ACTIVITY (only use if relevant to conversation):
 
         return content if content else None
 
+    def set_trigger_words(self, trigger_words, mode=None):
+        self.trigger_words = list(trigger_words)
+        if mode is not None:
+            self.trigger_mode = mode
+        self.trigger_matcher = TriggerMatcher(self.trigger_words, mode=self.trigger_mode)
+
+    def set_activity_triggers(self, activity_triggers):
+        self.activity_triggers = list(activity_triggers)
+        self.activity_matcher.set_triggers(self.activity_triggers)
+
     def contains_trigger_words(self, message):
-        content = message.content.lower().strip()
+        content = message.content.strip()
 
         if len(content) < 3:
-            return False
+            return None
 
         if not any(c.isalnum() for c in content):
-            return False
+            return None
 
-        if content.count("eyesore") > 2 or content.count("sinmoneyz") > 2:
-            return False
+        matches = self.trigger_matcher.find_all(content)
+        if not matches:
+            return None
 
-        for word in self.trigger_words:
-            word_lower = word.lower()
-            if word_lower in content:
-                words_in_message = content.split()
-                if any(word_lower in w for w in words_in_message):
-                    return True
+        counts = {}
+        for match in matches:
+            counts[match.trigger] = counts.get(match.trigger, 0) + 1
+            if counts[match.trigger] > self.max_trigger_repeats:
+                return None
 
-        return False
+        return matches[0]
 
     async def should_reply_to_message(self, channel_id: str, triggering_message_id: str) -> bool:
+        message_count = self.activity_tracker.count_since(channel_id, triggering_message_id)
+        if message_count is not None:
+            return message_count <= 2
+
         try:
             channel = self.bot.get_channel(int(channel_id))
             if not channel:
@@ -889,40 +996,302 @@ CURRENT ACTIVITY (only use if relevant to conversation):
             print(f"Error checking message count: {e}")
             return False
 
+    async def is_reply_to_self(self, message):
+        reference = message.reference
+
+        resolved = reference.resolved
+        if isinstance(resolved, discord.Message):
+            self.own_messages.record("resolved")
+            return resolved.author == self.bot.user
+
+        is_own = self.own_messages.lookup(reference.message_id)
+        if is_own:
+            self.own_messages.record("own_cache")
+            return True
+
+        cached = reference.cached_message
+        if cached is not None:
+            self.own_messages.record("client_cache")
+            return cached.author == self.bot.user
+
+        if is_own is not None:
+            self.own_messages.record("known_absent")
+            return False
+
+        self.own_messages.record("rest")
+        ref_msg = await message.channel.fetch_message(reference.message_id)
+        if ref_msg.author == self.bot.user:
+            self.own_messages.add(ref_msg.id)
+            return True
+        return False
+
     async def on_ready(self):
         print(f'done')
         if not self.statuses_loaded:
             await self.load_custom_statuses()
             self.statuses_loaded = True
-        self.background_tasks.start()
+        self.job_scheduler.start()
+
+    def register_jobs(self):
+        self.job_scheduler = JobScheduler()
+        scheduler = self.job_scheduler
+
+        scheduler.add_job("cycle_custom_status", self.cycle_custom_status, interval=300, jitter=30, timeout=60)
+        scheduler.add_job("update_status_randomly", self.update_status_randomly, interval=300, jitter=30, timeout=60)
+        scheduler.add_job("join_random_voice_channel", self.join_random_voice_channel, interval=300, jitter=60,
+                          timeout=1200)
+        scheduler.add_job("simulate_typing", self.simulate_typing_in_background, interval=300, jitter=60, timeout=60)
+        scheduler.add_job("sleep_check", self.update_sleep_state, interval=300, timeout=60)
+        scheduler.add_job("log_stats", self.log_stats, interval=self.stats_log_interval,
+                          initial_delay=self.stats_log_interval, timeout=60)
+
+    def collect_stats(self):
+        stats = {
+            "response_cache": self.response_cache.stats(),
+            "burst_coalescer": self.burst_coalescer.stats(),
+            "llm_scheduler": self.llm_scheduler.stats(),
+            "rate_limits": self.rate_limit_governor.stats(),
+            "models": self.model_registry.get_scoreboard(),
+            "streams": self.llm_client.get_stream_stats(),
+            "prompt_usage": self.prompt_assembler.usage_stats,
+            "conversation_history": self.conversation_history.stats(),
+            "activity_tracker": self.activity_tracker.stats(),
+            "own_messages": self.own_messages.stats(),
+            "commands": self.command_router.stats(),
+            "jobs": self.job_scheduler.stats(),
+            "state_store": self.state_store.stats()
+        }
+        if isinstance(self.message_memory, MessageMemory):
+            stats["memory_context_cache"] = {
+                "hits": self.message_memory.context_cache_hits,
+                "misses": self.message_memory.context_cache_misses
+            }
+        return stats
 
-    @tasks.loop(minutes=5)
-    async def background_tasks(self):
-        try:
-            await self.cycle_custom_status()
-            await self.update_status_randomly()
-            await self.join_random_voice_channel()
-            await self.simulate_typing_in_background()
-
-            if time.time() - self.last_sleep_check > 300:
-                should_sleep = self.should_be_asleep()
-                if should_sleep != self.is_asleep:
-                    self.is_asleep = should_sleep
-                    if should_sleep:
-                        await self.bot.change_presence(status=discord.Status.offline)
-                    else:
-                        await self.bot.change_presence(status=discord.Status.online)
-                    self.last_sleep_check = time.time()
+    async def log_stats(self):
+        print(f"Runtime stats: {json.dumps(self.collect_stats(), default=str)}")
 
-        except Exception as e:
-            print(f"Background task error: {e}")
+    async def update_sleep_state(self):
+        should_sleep = self.should_be_asleep()
+        if should_sleep != self.is_asleep:
+            self.is_asleep = should_sleep
+            if should_sleep:
+                await self.bot.change_presence(status=discord.Status.offline)
+            else:
+                await self.bot.change_presence(status=discord.Status.online)
+        self.last_sleep_check = time.time()
+
+    def register_commands(self):
+        self.command_router = CommandRouter(
+            permissions={
+                "everyone": lambda message: True,
+                "owner": lambda message: self.is_owner(message.author.id)
+            },
+            scopes={
+                "any": lambda message: True,
+                "guild": lambda message: message.guild is not None,
+                "command_channel": lambda message: message.guild is None or self.is_channel_allowed(str(message.channel.id))
+            }
+        )
+        router = self.command_router
+
+        router.register("!nickname", self.command_nickname, stage="pre_memory")
+        router.register("!personality", self.command_personality, stage="pre_memory")
+
+        router.register("!whitelist add", self.command_whitelist_add, permission="owner")
+        router.register("!whitelist remove", self.command_whitelist_remove, permission="owner")
+        router.register("!channel allow", self.command_channel_allow, permission="owner", scope="guild")
+        router.register("!channel deny", self.command_channel_deny, permission="owner", scope="guild")
+        router.register("!channel list", self.command_channel_list, permission="owner")
+        router.register("!channel only", self.command_channel_only, permission="owner")
+        router.register("!eyesore stop", self.command_eyesore_stop, permission="owner")
+        router.register("!stealth", self.command_stealth, permission="owner")
+        router.register("!statuses regenerate", self.command_statuses_regenerate, permission="owner")
+        router.register("!convo", self.command_convo, permission="owner")
+        router.register("!stats", self.command_stats, permission="owner")
+
+        router.register("!eyesore ping", self.command_role_ping, scope="command_channel")
+        router.register("!ping role", self.command_role_ping, scope="command_channel")
+
+    async def command_nickname(self, message, args):
+        nickname = args.strip()
+        if not nickname:
+            return False
+
+        user_id = str(message.author.id)
+        self.nicknames[user_id] = nickname
+        self.save_nicknames()
+        await message.reply("k", mention_author=False)
+        print(f"Saved nickname '{nickname}' for user {message.author.display_name}")
+        return True
+
+    async def command_personality(self, message, args):
+        if not args:
+            return False
+
+        preset_name = args.strip().lower()
+        if preset_name in self.personality_presets:
+            user_id = str(message.author.id)
+            self.personalities[user_id] = self.personality_presets[preset_name]
+            self.save_personalities()
+            await message.reply("k", mention_author=False)
+            print(f"Saved personality preset '{preset_name}' for user {message.author.display_name}")
+        else:
+            available = ", ".join(self.personality_presets.keys())
+            await message.reply(f"invalid preset. available: {available}", mention_author=False)
+        return True
 
-    @background_tasks.before_loop
-    async def before_background_tasks(self):
-        await self.bot.wait_until_ready()
+    async def command_whitelist_add(self, message, args):
+        if not message.mentions:
+            return False
+
+        for user in message.mentions:
+            self.whitelisted_users.add(str(user.id))
+        self.save_whitelist()
+        if self.stealth_mode:
+            await message.reply("k", mention_author=False)
+        else:
+            await message.reply(f"added {len(message.mentions)} users", mention_author=False)
+        return True
+
+    async def command_whitelist_remove(self, message, args):
+        if not message.mentions:
+            return False
+
+        for user in message.mentions:
+            self.whitelisted_users.discard(str(user.id))
+        self.save_whitelist()
+        if self.stealth_mode:
+            await message.reply("k", mention_author=False)
+        else:
+            await message.reply(f"removed {len(message.mentions)} users", mention_author=False)
+        return True
+
+    async def command_channel_allow(self, message, args):
+        channel_id = str(message.channel.id)
+        print(f"Adding channel {channel_id} to allowed")
+        self.allowed_channels.add(channel_id)
+        self.save_allowed_channels()
+        print("Saved allowed channels")
+        if self.stealth_mode:
+            await message.reply("bet", mention_author=False)
+        else:
+            await message.reply("channel allowed", mention_author=False)
+        return True
+
+    async def command_channel_deny(self, message, args):
+        self.allowed_channels.discard(str(message.channel.id))
+        self.save_allowed_channels()
+        if self.stealth_mode:
+            await message.reply("k", mention_author=False)
+        else:
+            await message.reply("channel denied", mention_author=False)
+        return True
+
+    async def command_channel_list(self, message, args):
+        allowed_list = list(self.allowed_channels) if self.allowed_channels else ["all channels"]
+        if self.stealth_mode:
+            await message.reply(f"allowed: {', '.join(allowed_list)}", mention_author=False)
+        else:
+            await message.reply(f"Allowed channels: {', '.join(allowed_list)}", mention_author=False)
+        return True
+
+    async def command_channel_only(self, message, args):
+        if not message.channel_mentions:
+            return False
+
+        channel = message.channel_mentions[0]
+        self.allowed_channels.clear()
+        self.allowed_channels.add(str(channel.id))
+        self.save_allowed_channels()
+        if self.stealth_mode:
+            await message.reply("bet", mention_author=False)
+        else:
+            await message.reply(f"locked to {channel.mention}", mention_author=False)
+        return True
+
+    async def command_eyesore_stop(self, message, args):
+        guild_id = str(message.guild.id) if message.guild else None
+        if guild_id and guild_id in self.role_ping_targets:
+            del self.role_ping_targets[guild_id]
+            self.save_bot_settings()
+        if self.stealth_mode:
+            await message.reply("fine", mention_author=False)
+        else:
+            await message.reply("stopped watching role", mention_author=False)
+        return True
+
+    async def command_stealth(self, message, args):
+        self.stealth_mode = not self.stealth_mode
+        self.save_bot_settings()
+        mode = "on" if self.stealth_mode else "off"
+        if self.stealth_mode:
+            await message.reply("k", mention_author=False)
+        else:
+            await message.reply(f"stealth {mode}", mention_author=False)
+        return True
+
+    async def command_statuses_regenerate(self, message, args):
+        await self.generate_ai_statuses()
+        if self.stealth_mode:
+            responses = [
+                "bet",
+                "k",
+                "fine",
+                "whatever"
+            ]
+            await message.reply(random.choice(responses), mention_author=False)
+        else:
+            await message.reply(f"regenerated {len(self.custom_statuses)} statuses", mention_author=False)
+        return True
+
+    async def command_convo(self, message, args):
+        if not message.guild:
+            await message.reply("nah", mention_author=False)
+            return True
+
+        channel_id = str(message.channel.id)
+        if channel_id in self.conversation_channels:
+            self.conversation_channels.discard(channel_id)
+            mode = "disabled"
+        else:
+            self.conversation_channels.add(channel_id)
+            mode = "enabled"
+        if self.stealth_mode:
+            await message.reply("k", mention_author=False)
+        else:
+            await message.reply(f"conversation mode {mode}", mention_author=False)
+        return True
+
+    async def command_stats(self, message, args):
+        stats = self.collect_stats()
+        print(f"Runtime stats: {json.dumps(stats, default=str)}")
+        if self.stealth_mode:
+            await message.reply("k", mention_author=False)
+        else:
+            await message.reply(
+                f"response cache hit rate {stats['response_cache']['hit_rate']:.0%}, "
+                f"{stats['burst_coalescer']['llm_calls_saved']} calls saved by bursts, "
+                f"{stats['llm_scheduler']['in_flight']} llm calls in flight, "
+                f"{stats['activity_tracker']['local_rate']:.0%} reply checks answered locally "
+                f"(full stats in console)",
+                mention_author=False
+            )
+        return True
+
+    async def command_role_ping(self, message, args):
+        return await self.handle_role_ping_command(message, message.content)
 
     async def on_message(self, message):
+        self.activity_tracker.record(
+            str(message.channel.id),
+            str(message.id),
+            str(message.author.id),
+            message.author == self.bot.user
+        )
+
         if message.author == self.bot.user:
+            self.own_messages.add(message.id)
             return
 
         if message.is_system() or (message.author.bot and message.author != self.bot.user):
@@ -935,178 +1304,31 @@ CURRENT ACTIVITY (only use if relevant to conversation):
             return
 
         channel_id = str(message.channel.id)
-        if channel_id not in self.conversation_history:
-            self.conversation_history[channel_id] = []
-
-        content_lower = message.content.lower().strip()
-
-        if content_lower.startswith("!nickname "):
-            nickname = message.content[10:].strip()
-            if nickname:
-                user_id = str(message.author.id)
-                self.nicknames[user_id] = nickname
-                self.save_nicknames()
-                await message.reply("k", mention_author=False)
-                print(f"Saved nickname '{nickname}' for user {message.author.display_name}")
-                return
-
-        if content_lower.startswith("!personality "):
-            preset_name = message.content[13:].strip().lower()
-            if preset_name in self.personality_presets:
-                user_id = str(message.author.id)
-                self.personalities[user_id] = self.personality_presets[preset_name]
-                self.save_personalities()
-                await message.reply("k", mention_author=False)
-                print(f"Saved personality preset '{preset_name}' for user {message.author.display_name}")
-            else:
-                available = ", ".join(self.personality_presets.keys())
-                await message.reply(f"invalid preset. available: {available}", mention_author=False)
+        guild_id = str(message.guild.id) if message.guild else None
+        if await self.command_router.dispatch(message, "pre_memory"):
             return
 
-        self.message_memory.add_message(
+        memory_position = self.message_memory.add_message(
             message=message.content,
             user_name=self.get_user_name(message.author),
             channel_id=channel_id,
-            message_type="user"
+            message_type="user",
+            guild_id=guild_id
         )
 
-        self.conversation_history[channel_id].append({
-            "role": "user",
-            "content": message.content,
-            "user_name": self.get_user_name(message.author)
-        })
-
-        if len(self.conversation_history[channel_id]) > self.max_history_length:
-            self.conversation_history[channel_id] = self.conversation_history[channel_id][-self.max_history_length:]
+        self.conversation_history.append(
+            channel_id,
+            "user",
+            message.content,
+            self.get_user_name(message.author)
+        )
 
         should_respond = False
         user_message = None
         response_reason = None
 
-        content_lower = message.content.lower().strip()
-        is_command_channel = message.guild is None or self.is_channel_allowed(channel_id)
-
-        if self.is_owner(message.author.id):
-            if content_lower.startswith('!whitelist add'):
-                if message.mentions:
-                    for user in message.mentions:
-                        self.whitelisted_users.add(str(user.id))
-                    self.save_whitelist()
-                    if self.stealth_mode:
-                        await message.reply("k", mention_author=False)
-                    else:
-                        await message.reply(f"added {len(message.mentions)} users", mention_author=False)
-                    return
-
-            elif content_lower.startswith('!whitelist remove'):
-                if message.mentions:
-                    for user in message.mentions:
-                        self.whitelisted_users.discard(str(user.id))
-                    self.save_whitelist()
-                    if self.stealth_mode:
-                        await message.reply("k", mention_author=False)
-                    else:
-                        await message.reply(f"removed {len(message.mentions)} users", mention_author=False)
-                    return
-
-            elif content_lower.startswith('!channel allow'):
-                if message.guild:
-                    print(f"Adding channel {channel_id} to allowed")
-                    self.allowed_channels.add(channel_id)
-                    self.save_allowed_channels()
-                    print("Saved allowed channels")
-                    if self.stealth_mode:
-                        await message.reply("bet", mention_author=False)
-                    else:
-                        await message.reply("channel allowed", mention_author=False)
-                    return
-
-            elif content_lower.startswith('!channel deny'):
-                if message.guild:
-                    self.allowed_channels.discard(channel_id)
-                    self.save_allowed_channels()
-                    if self.stealth_mode:
-                        await message.reply("k", mention_author=False)
-                    else:
-                        await message.reply("channel denied", mention_author=False)
-                    return
-
-            elif content_lower.startswith('!channel list'):
-                allowed_list = list(self.allowed_channels) if self.allowed_channels else ["all channels"]
-                if self.stealth_mode:
-                    await message.reply(f"allowed: {', '.join(allowed_list)}", mention_author=False)
-                else:
-                    await message.reply(f"Allowed channels: {', '.join(allowed_list)}", mention_author=False)
-                return
-
-            elif content_lower.startswith('!channel only'):
-                if message.channel_mentions:
-                    channel = message.channel_mentions[0]
-                    self.allowed_channels.clear()
-                    self.allowed_channels.add(str(channel.id))
-                    self.save_allowed_channels()
-                    if self.stealth_mode:
-                        await message.reply("bet", mention_author=False)
-                    else:
-                        await message.reply(f"locked to {channel.mention}", mention_author=False)
-                    return
-
-            elif content_lower.startswith('!eyesore stop'):
-                guild_id = str(message.guild.id) if message.guild else None
-                if guild_id and guild_id in self.role_ping_targets:
-                    del self.role_ping_targets[guild_id]
-                    self.save_bot_settings()
-                if self.stealth_mode:
-                    await message.reply("fine", mention_author=False)
-                else:
-                    await message.reply("stopped watching role", mention_author=False)
-                return
-
-            elif content_lower.startswith('!stealth'):
-                self.stealth_mode = not self.stealth_mode
-                self.save_bot_settings()
-                mode = "on" if self.stealth_mode else "off"
-                if self.stealth_mode:
-                    await message.reply("k", mention_author=False)
-                else:
-                    await message.reply(f"stealth {mode}", mention_author=False)
-                return
-
-            elif content_lower.startswith('!statuses regenerate'):
-                await self.generate_ai_statuses()
-                if self.stealth_mode:
-                    responses = [
-                        "bet",
-                        "k",
-                        "fine",
-                        "whatever"
-                    ]
-                    await message.reply(random.choice(responses), mention_author=False)
-                else:
-                    await message.reply(f"regenerated {len(self.custom_statuses)} statuses", mention_author=False)
-                return
-
-            elif content_lower.startswith('!convo'):
-                if message.guild:
-                    if channel_id in self.conversation_channels:
-                        self.conversation_channels.discard(channel_id)
-                        mode = "disabled"
-                    else:
-                        self.conversation_channels.add(channel_id)
-                        mode = "enabled"
-                    if self.stealth_mode:
-                        await message.reply("k", mention_author=False)
-                    else:
-                        await message.reply(f"conversation mode {mode}", mention_author=False)
-                else:
-                    await message.reply("nah", mention_author=False)
-                return
-
-        if is_command_channel:
-            if content_lower.startswith('!eyesore ping') or content_lower.startswith('!ping role'):
-                handled = await self.handle_role_ping_command(message, message.content)
-                if handled:
-                    return
+        if await self.command_router.dispatch(message, "post_memory"):
+            return
 
         if message.guild and not self.is_channel_allowed(channel_id):
             print(f"Channel {channel_id} not allowed, len={len(self.allowed_channels)}, allowed={self.allowed_channels}")
@@ -1132,8 +1354,7 @@ CURRENT ACTIVITY (only use if relevant to conversation):
 
         elif message.reference and message.reference.message_id:
             try:
-                ref_msg = await message.channel.fetch_message(message.reference.message_id)
-                if ref_msg.author == self.bot.user:
+                if await self.is_reply_to_self(message):
                     user_message = message.content
                     should_respond = True
                     response_reason = "reply-to-bot"
@@ -1149,7 +1370,7 @@ CURRENT ACTIVITY (only use if relevant to conversation):
                     response_reason = "passive"
 
         elif channel_id in self.conversation_channels and channel_id in self.conversation_history:
-            recent_messages = [msg for msg in self.conversation_history[channel_id][-10:] if msg["role"] == "assistant"]
+            recent_messages = [msg for msg in self.conversation_history.get(channel_id, limit=10) if msg.role == "assistant"]
             if recent_messages:
                 time_since_last = time.time() - self.last_response_time.get(channel_id, 0)
                 if time_since_last < 1800:
@@ -1162,14 +1383,30 @@ CURRENT ACTIVITY (only use if relevant to conversation):
                 print(f"Message from {self.get_user_name(message.author)} ({response_reason}): {user_message}")
 
                 delay = self.get_response_delay()
-                await asyncio.sleep(delay)
+                burst = await self.burst_coalescer.collect(channel_id, (message, user_message, memory_position), delay)
+                if burst is None:
+                    print(f"Merged message from {self.get_user_name(message.author)} into open burst in {channel_id}")
+                    return
+
+                message, user_message, _ = burst[-1]
+                if len(burst) > 1:
+                    user_message = "\n".join(
+                        f"{self.get_user_name(burst_message.author)}: {burst_text}"
+                        for burst_message, burst_text, _ in burst
+                    )
+
+                dm_channel = getattr(message.author, "dm_channel", None)
 
                 async with message.channel.typing():
                     ai_response, model_used = await self.get_ai_response(
                         user_message,
                         channel_id=channel_id,
                         user_name=self.get_user_name(message.author),
-                        user_id=str(message.author.id)
+                        user_id=str(message.author.id),
+                        guild_id=guild_id,
+                        dm_channel_id=str(dm_channel.id) if dm_channel else None,
+                        priority=response_reason,
+                        memory_exclude=[position for _, _, position in burst if position is not None]
                     )
 
                     if not ai_response or not ai_response.strip():
@@ -1181,14 +1418,16 @@ CURRENT ACTIVITY (only use if relevant to conversation):
                         message=typo_response,
                         user_name="eyesore",
                         channel_id=channel_id,
-                        message_type="assistant"
+                        message_type="assistant",
+                        guild_id=guild_id
                     )
 
-                    self.conversation_history[channel_id].append({
-                        "role": "assistant",
-                        "content": typo_response,
-                        "user_name": "eyesore"
-                    })
+                    self.conversation_history.append(
+                        channel_id,
+                        "assistant",
+                        typo_response,
+                        "eyesore"
+                    )
 
                     self.last_response_time[channel_id] = time.time()
 
@@ -1205,6 +1444,8 @@ CURRENT ACTIVITY (only use if relevant to conversation):
                             response_message = await message.reply(typo_response, mention_author=False)
                             print(f"Responded using model: {model_used}\nresponse: {typo_response} (replied)")
 
+                    self.own_messages.add(response_message.id)
+
                     if has_typo:
                         await asyncio.sleep(random.uniform(2, 5))
                         try:
@@ -1215,10 +1456,25 @@ CURRENT ACTIVITY (only use if relevant to conversation):
             else:
                 await message.reply("why the fuck are you just mentioning me", mention_author=False)
 
+    async def close(self):
+        await self.job_scheduler.stop()
+        await self.llm_client.close()
+        self.response_cache.save()
+        self.state_store.close()
+        self.message_memory.close()
+
     def run(self):
         self.bot.event(self.on_ready)
         self.bot.event(self.on_message)
 
+        original_close = self.bot.close
+
+        async def close_with_cleanup():
+            await self.close()
+            await original_close()
+
+        self.bot.close = close_with_cleanup
+
         self.bot.run(self.token)
 
 if __name__ == "__main__":
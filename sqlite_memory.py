@@ -0,0 +1,281 @@
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional
+from datetime import datetime
+
+from message_memory import MessageMemory, format_memory_context, tokenize
+
+
+class SQLiteMessageMemory:
+
+    def __init__(self, db_file: str = "message_memory.db", max_memory_items: Optional[int] = None,
+                 retention_days: Optional[float] = None, import_file: Optional[str] = "message_memory.json",
+                 context_quotas: Optional[Dict[str, int]] = None):
+        self.db_file = db_file
+        self.context_quotas = context_quotas or {"channel": 8, "guild": 4, "dm": 3}
+        self.max_memory_items = max_memory_items
+        self.retention_days = retention_days
+        self.conn = sqlite3.connect(db_file)
+        self.conn.row_factory = sqlite3.Row
+        self._init_db()
+
+        if import_file and self._get_metadata("json_imported") is None:
+            if self.get_memory_size() == 0:
+                self._import_json(import_file)
+            self._set_metadata("json_imported", datetime.now().isoformat())
+
+    def _init_db(self):
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                entry_id TEXT,
+                message TEXT NOT NULL,
+                user_name TEXT NOT NULL,
+                channel_id TEXT,
+                guild_id TEXT,
+                type TEXT NOT NULL,
+                timestamp REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp);
+            CREATE INDEX IF NOT EXISTS idx_messages_user_name ON messages(user_name, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_messages_channel_id ON messages(channel_id, timestamp);
+            CREATE TABLE IF NOT EXISTS metadata (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(messages)")}
+        if "guild_id" not in columns:
+            self.conn.execute("ALTER TABLE messages ADD COLUMN guild_id TEXT")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_guild_id ON messages(guild_id, timestamp)"
+        )
+        self.conn.execute(
+            "INSERT OR IGNORE INTO metadata (key, value) VALUES ('created_at', ?)",
+            (datetime.now().isoformat(),)
+        )
+        self.conn.commit()
+
+    def _get_metadata(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM metadata WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_metadata(self, key: str, value: str):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+                (key, value)
+            )
+
+    def _import_json(self, import_file: str):
+        if not os.path.exists(import_file):
+            return
+
+        json_memory = MessageMemory(memory_file=import_file)
+        rows = [
+            (msg.id, msg.message, msg.user_name, msg.channel_id, msg.guild_id, msg.type, msg.timestamp)
+            for msg in json_memory.memory_data["messages"]
+        ]
+        json_memory.journal.close()
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO messages (entry_id, message, user_name, channel_id, guild_id, type, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        print(f"Imported {len(rows)} messages from {import_file}")
+
+    def _row_to_dict(self, row: sqlite3.Row) -> Dict:
+        return {
+            "id": row["entry_id"] or f"{row['timestamp']}_{row['user_name']}_{row['id']}",
+            "message": row["message"],
+            "user_name": row["user_name"],
+            "channel_id": row["channel_id"],
+            "guild_id": row["guild_id"],
+            "type": row["type"],
+            "timestamp": row["timestamp"],
+            "date": datetime.fromtimestamp(row["timestamp"]).isoformat()
+        }
+
+    def _evict(self):
+        if self.retention_days is not None:
+            cutoff_time = time.time() - (self.retention_days * 86400)
+            self.conn.execute("DELETE FROM messages WHERE timestamp < ?", (cutoff_time,))
+
+        if self.max_memory_items is not None:
+            self.conn.execute(
+                "DELETE FROM messages WHERE id <= (SELECT MAX(id) FROM messages) - ?",
+                (self.max_memory_items,)
+            )
+
+    def add_message(self, message: str, user_name: str, channel_id: str,
+                    message_type: str = "user", timestamp: Optional[float] = None,
+                    guild_id: Optional[str] = None) -> Optional[int]:
+        if not message or not message.strip():
+            return None
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        try:
+            with self.conn:
+                cursor = self.conn.execute(
+                    "INSERT INTO messages (message, user_name, channel_id, guild_id, type, timestamp) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (message.strip(), user_name, channel_id, guild_id, message_type, timestamp)
+                )
+                self._evict()
+            return cursor.lastrowid
+        except sqlite3.Error as e:
+            print(f"Error saving memory to {self.db_file}: {e}")
+            return None
+
+    def get_recent_messages(self, limit: int = 10, hours: int = 24,
+                            user_name: Optional[str] = None) -> List[Dict]:
+        cutoff_time = time.time() - (hours * 3600)
+
+        if user_name is None:
+            rows = self.conn.execute(
+                "SELECT * FROM messages WHERE timestamp >= ? ORDER BY timestamp DESC LIMIT ?",
+                (cutoff_time, limit)
+            )
+        else:
+            rows = self.conn.execute(
+                "SELECT * FROM messages WHERE user_name = ? AND timestamp >= ? "
+                "ORDER BY timestamp DESC LIMIT ?",
+                (user_name, cutoff_time, limit)
+            )
+
+        return [self._row_to_dict(row) for row in rows]
+
+    def _scoped_messages(self, limit: int, cutoff_time: float, channel_id: Optional[str],
+                         guild_id: Optional[str], dm_channel_id: Optional[str]) -> List[Dict]:
+        scopes = [
+            ("channel", "channel_id = ?", (channel_id,)),
+            ("guild", "guild_id = ? AND channel_id IS NOT ?", (guild_id, channel_id)),
+        ]
+        if dm_channel_id is not None and dm_channel_id != channel_id:
+            scopes.append(("dm", "channel_id = ?", (dm_channel_id,)))
+
+        messages = []
+        carry = 0
+        for scope, clause, params in scopes:
+            quota = min(self.context_quotas.get(scope, 0) + carry, limit - len(messages))
+            if quota <= 0:
+                continue
+            rows = self.conn.execute(
+                f"SELECT * FROM messages WHERE {clause} AND timestamp >= ? ORDER BY timestamp DESC LIMIT ?",
+                (*params, cutoff_time, quota)
+            ).fetchall()
+            messages.extend(self._row_to_dict(row) for row in rows)
+            carry = quota - len(rows)
+
+        messages.sort(key=lambda x: x["timestamp"])
+        return messages
+
+    def get_memory_context(self, limit: int = 15, hours: int = 48, channel_id: Optional[str] = None,
+                           guild_id: Optional[str] = None, dm_channel_id: Optional[str] = None,
+                           query: Optional[str] = None, exclude: Optional[Iterable[int]] = None) -> str:
+        if channel_id is None and guild_id is None and dm_channel_id is None:
+            recent_messages = self.get_recent_messages(limit=limit, hours=hours)
+            return format_memory_context(list(reversed(recent_messages)))
+
+        cutoff_time = time.time() - (hours * 3600)
+        return format_memory_context(
+            self._scoped_messages(limit, cutoff_time, channel_id, guild_id, dm_channel_id)
+        )
+
+    def search_messages(self, query: str, user_name: Optional[str] = None,
+                        channel_id: Optional[str] = None, since: Optional[float] = None,
+                        until: Optional[float] = None, prefix: bool = True,
+                        limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        clauses = []
+        params = []
+        for term in terms:
+            escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append("message LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+
+        for column, value in (("user_name", user_name), ("channel_id", channel_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp <= ?")
+            params.append(until)
+
+        params.extend([limit if limit is not None else -1, offset])
+        rows = self.conn.execute(
+            f"SELECT * FROM messages WHERE {' AND '.join(clauses)} ORDER BY timestamp LIMIT ? OFFSET ?",
+            params
+        )
+
+        return [self._row_to_dict(row) for row in rows]
+
+    STATS_COLUMNS = (
+        "COUNT(*) AS total, MIN(timestamp) AS first, MAX(timestamp) AS last, "
+        "COALESCE(SUM(LENGTH(CAST(message AS BLOB))), 0) AS bytes_stored, "
+        "COALESCE(SUM(type = 'assistant'), 0) AS assistant_messages"
+    )
+
+    def _stats_to_dict(self, row: sqlite3.Row) -> Dict:
+        total = row["total"]
+        return {
+            "total_messages": total,
+            "first_message": datetime.fromtimestamp(row["first"]).isoformat() if total else None,
+            "last_message": datetime.fromtimestamp(row["last"]).isoformat() if total else None,
+            "bytes_stored": row["bytes_stored"],
+            "user_messages": total - row["assistant_messages"],
+            "assistant_messages": row["assistant_messages"]
+        }
+
+    def get_user_stats(self, user_name: str) -> Dict:
+        row = self.conn.execute(
+            f"SELECT {self.STATS_COLUMNS} FROM messages WHERE user_name = ?",
+            (user_name,)
+        ).fetchone()
+        return {"user_name": user_name, **self._stats_to_dict(row)}
+
+    def get_channel_stats(self, channel_id: str) -> Dict:
+        row = self.conn.execute(
+            f"SELECT {self.STATS_COLUMNS} FROM messages WHERE channel_id = ?",
+            (channel_id,)
+        ).fetchone()
+        return {"channel_id": channel_id, **self._stats_to_dict(row)}
+
+    def get_all_user_stats(self) -> List[Dict]:
+        rows = self.conn.execute(
+            f"SELECT user_name, {self.STATS_COLUMNS} FROM messages GROUP BY user_name"
+        )
+        return [{"user_name": row["user_name"], **self._stats_to_dict(row)} for row in rows]
+
+    def get_all_channel_stats(self) -> List[Dict]:
+        rows = self.conn.execute(
+            f"SELECT channel_id, {self.STATS_COLUMNS} FROM messages GROUP BY channel_id"
+        )
+        return [{"channel_id": row["channel_id"], **self._stats_to_dict(row)} for row in rows]
+
+    def clear_memory(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM messages")
+            self.conn.execute(
+                "UPDATE metadata SET value = ? WHERE key = 'created_at'",
+                (datetime.now().isoformat(),)
+            )
+
+    def get_memory_size(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class StateStore:
+
+    def __init__(self, debounce: float = 1.0, indent: Optional[int] = 2, fsync: bool = True):
+        self.debounce = debounce
+        self.indent = indent
+        self.fsync = fsync
+        self._pending: Dict[str, Any] = {}
+        self._dirty_since: Optional[float] = None
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self.requested_writes = 0
+        self.completed_writes = 0
+        self.failed_writes = 0
+        self._worker = threading.Thread(target=self._run, name="state-store", daemon=True)
+        self._worker.start()
+
+    def load(self, path: str, default: Optional[Dict] = None) -> Dict:
+        with self._condition:
+            if path in self._pending:
+                return self._pending[path]
+
+        if not os.path.exists(path):
+            return default if default is not None else {}
+
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def write(self, path: str, data: Any):
+        with self._condition:
+            self._pending[path] = data
+            self.requested_writes += 1
+            closed = self._closed
+            if not closed and self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+                self._condition.notify()
+
+        if closed:
+            self.flush()
+
+    def _write_file(self, path: str, data: Any):
+        tmp_file = f"{path}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=self.indent)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(tmp_file, path)
+            self.completed_writes += 1
+        except (OSError, TypeError, ValueError) as e:
+            self.failed_writes += 1
+            print(f"Error saving {path}: {e}")
+
+    def _take_pending(self) -> Dict[str, Any]:
+        pending = self._pending
+        self._pending = {}
+        self._dirty_since = None
+        return pending
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._dirty_since is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+
+                remaining = self.debounce - (time.monotonic() - self._dirty_since)
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            with self._condition:
+                pending = self._take_pending()
+            for path, data in pending.items():
+                self._write_file(path, data)
+
+    def stats(self) -> Dict:
+        return {
+            "pending": len(self._pending),
+            "requested_writes": self.requested_writes,
+            "completed_writes": self.completed_writes,
+            "failed_writes": self.failed_writes,
+            "coalesced_writes": self.requested_writes - self.completed_writes - self.failed_writes - len(self._pending)
+        }
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._worker.join()
+        self.flush()
@@ -0,0 +1,134 @@
+import re
+from itertools import combinations
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class TriggerMatch(NamedTuple):
+    trigger: str
+    start: int
+    end: int
+    fuzzy: bool = False
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+    before_previous: List[int] = []
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            )
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                current[j] = min(current[j], before_previous[j - 2] + 1)
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+class TriggerMatcher:
+
+    MODES = ("substring", "word", "fuzzy")
+
+    def __init__(self, triggers: Iterable[str], mode: str = "substring", max_edits: int = 1,
+                 min_fuzzy_length: int = 5):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown trigger mode: {mode}")
+        self.mode = mode
+        self.max_edits = max_edits
+        self.min_fuzzy_length = min_fuzzy_length
+        self.triggers: List[str] = []
+        self._lookup: Dict[str, str] = {}
+        self._pattern: Optional[re.Pattern] = None
+        self._deletions: Dict[str, Set[str]] = {}
+        self.set_triggers(triggers)
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return WHITESPACE_PATTERN.sub(" ", text.lower().strip())
+
+    def _deletion_variants(self, word: str) -> Set[str]:
+        variants = {word}
+        for edits in range(1, min(self.max_edits, len(word) - 1) + 1):
+            for positions in combinations(range(len(word)), edits):
+                variants.add("".join(char for i, char in enumerate(word) if i not in positions))
+        return variants
+
+    def set_triggers(self, triggers: Iterable[str]):
+        self.triggers = [trigger for trigger in triggers if trigger and trigger.strip()]
+        self._lookup = {self._normalize(trigger): trigger for trigger in self.triggers}
+        self._deletions = {}
+
+        if not self._lookup:
+            self._pattern = None
+            return
+
+        alternatives = "|".join(
+            r"\s+".join(re.escape(part) for part in key.split(" "))
+            for key in sorted(self._lookup, key=len, reverse=True)
+        )
+        if self.mode == "substring":
+            self._pattern = re.compile(alternatives, re.IGNORECASE)
+        else:
+            self._pattern = re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)", re.IGNORECASE)
+
+        if self.mode == "fuzzy":
+            for key in self._lookup:
+                if " " in key or len(key) < self.min_fuzzy_length:
+                    continue
+                for variant in self._deletion_variants(key):
+                    self._deletions.setdefault(variant, set()).add(key)
+
+    def _fuzzy_matches(self, text: str) -> List[TriggerMatch]:
+        matches = []
+        for token in WORD_PATTERN.finditer(text):
+            word = token.group(0).lower()
+            if len(word) < self.min_fuzzy_length - self.max_edits or word in self._lookup:
+                continue
+
+            candidates = set()
+            for variant in self._deletion_variants(word):
+                candidates.update(self._deletions.get(variant, ()))
+
+            best = None
+            for candidate in candidates:
+                distance = edit_distance(word, candidate, self.max_edits)
+                if distance <= self.max_edits and (best is None or distance < best[0]):
+                    best = (distance, candidate)
+            if best is not None:
+                matches.append(TriggerMatch(self._lookup[best[1]], token.start(), token.end(), True))
+        return matches
+
+    def find_all(self, text: str) -> List[TriggerMatch]:
+        if self._pattern is None or not text:
+            return []
+
+        matches = [
+            TriggerMatch(self._lookup[self._normalize(match.group(0))], match.start(), match.end())
+            for match in self._pattern.finditer(text)
+        ]
+        if self.mode == "fuzzy":
+            matches.extend(self._fuzzy_matches(text))
+            matches.sort(key=lambda match: match.start)
+        return matches
+
+    def find(self, text: str) -> Optional[TriggerMatch]:
+        if self._pattern is None or not text:
+            return None
+
+        match = self._pattern.search(text)
+        if match is not None:
+            return TriggerMatch(self._lookup[self._normalize(match.group(0))], match.start(), match.end())
+
+        if self.mode == "fuzzy":
+            fuzzy = self._fuzzy_matches(text)
+            if fuzzy:
+                return fuzzy[0]
+        return None